@@ -1,17 +1,25 @@
 """
 Streamlit web interface for Lab o Future chatbot.
 """
-import os
 import streamlit as st
 import time
 
-from main import create_chatbot
+from main import LabOFutureChatbot, get_shared_resources
+
+
+@st.cache_resource
+def get_chatbot_resources():
+    """Build the knowledge base and handlers once per process, shared by all sessions."""
+    return get_shared_resources()
 
 
 def initialize_session_state():
     """Initialize session state variables."""
     if "chatbot" not in st.session_state:
-        st.session_state.chatbot = create_chatbot()
+        resources = get_chatbot_resources()
+        start = time.perf_counter()
+        st.session_state.chatbot = LabOFutureChatbot(resources=resources)
+        resources.perf_monitor.record("session_init", time.perf_counter() - start)
         
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -32,6 +40,8 @@ def display_chat_messages():
                     metadata = message["metadata"]
                     st.markdown(f"**Source**: {metadata.get('source', 'Unknown')}")
                     st.markdown(f"**Response Time**: {metadata.get('query_time', 0):.2f} seconds")
+                    if metadata.get("time_to_first_token") is not None:
+                        st.markdown(f"**Time to First Token**: {metadata['time_to_first_token']:.2f} seconds")
                     
                     # Show confidence if available
                     if "confidence" in metadata and metadata["confidence"] > 0:
@@ -104,7 +114,16 @@ def main():
                 st.markdown(f"**{op_name}**")
                 st.markdown(f"- Avg time: {op_stats['avg']:.3f}s")
                 st.markdown(f"- Min/Max: {op_stats['min']:.3f}s / {op_stats['max']:.3f}s")
+                st.markdown(f"- p50/p95/p99: {op_stats['p50']:.3f}s / {op_stats['p95']:.3f}s / {op_stats['p99']:.3f}s")
                 st.markdown(f"- Calls: {op_stats['count']}")
+        
+        # Semantic cache stats
+        with st.expander("Cache Stats"):
+            for persona_key, cache_stats in st.session_state.chatbot.get_cache_stats().items():
+                st.markdown(f"**{persona_key}**")
+                st.markdown(f"- Hit rate: {cache_stats['hit_rate']:.0%}")
+                st.markdown(f"- Hits/Misses: {cache_stats['hits']} / {cache_stats['misses']}")
+                st.markdown(f"- Bypassed: {cache_stats['bypassed']}")
     
     # Main chat interface
     st.header("Lab o Future Educational Assistant")
@@ -123,18 +142,18 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Get response from chatbot
+        # Stream response from chatbot
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.chatbot.get_response(prompt)
-                st.markdown(response["text"])
-                
-                # Add response to chat history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response["text"],
-                    "metadata": response["metadata"]
-                })
+            with st.spinner("Searching..."):
+                response = st.session_state.chatbot.get_response_stream(prompt)
+            st.write_stream(response["stream"])
+            
+            # Add response to chat history
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response["text"],
+                "metadata": response["metadata"]
+            })
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""
+Concurrency benchmark for the chatbot answer path.
+
+Compares the old print_response + stdout capture path, which has to be
+serialized on the process-global sys.stdout, with generate_answer, which
+returns the answer directly. By default a stand-in agent simulates model
+latency so the benchmark runs without a database or API key; pass --live
+to drive LabOFutureChatbot.generate against the real model.
+
+Usage:
+    python bench_concurrency.py --requests 64 --sessions 1 2 4 8 16
+"""
+import argparse
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from main import generate_answer
+
+SAMPLE_QUERIES = [
+    "What courses does Lab of Future offer?",
+    "Tell me about the Space Robotics program",
+    "How do I book a lab tour?",
+    "Is there a summer camp in Dubai?",
+    "What is the School in Space program?",
+    "How can I become a LOF ambassador?",
+]
+
+
+class StandInAgent:
+    """Agent stand-in that sleeps like a network-bound model call."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.model = SimpleNamespace(id="stand-in")
+
+    def _answer(self, message: str) -> str:
+        time.sleep(self.latency)
+        return f"Answer to: {message}"
+
+    def run(self, message: str, stream: bool = False):
+        return SimpleNamespace(content=self._answer(message), run_id=None, metrics={})
+
+    def print_response(self, message: str, markdown: bool = True):
+        print(self._answer(message))
+
+
+_stdout_lock = threading.Lock()
+
+
+def capture_stdout_answer(agent, message: str) -> str:
+    """The previous answer path: swap sys.stdout around print_response."""
+    with _stdout_lock:
+        original_stdout = sys.stdout
+        captured_output = io.StringIO()
+        sys.stdout = captured_output
+        try:
+            agent.print_response(message, markdown=True)
+        finally:
+            sys.stdout = original_stdout
+    return captured_output.getvalue()
+
+
+def run_load(answer: Callable[[str], object], requests: int, sessions: int) -> Dict[str, float]:
+    """
+    Send requests from a number of parallel sessions and time them.
+
+    Args:
+        answer: Callable that answers one query
+        requests: Total number of requests to send
+        sessions: Number of concurrent sessions (threads)
+
+    Returns:
+        Wall time and throughput for the run
+    """
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(answer, queries))
+    elapsed = time.perf_counter() - start
+
+    return {"sessions": sessions, "wall_time": elapsed, "throughput": requests / elapsed}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in model latency in seconds")
+    parser.add_argument("--live", action="store_true", help="Use the real chatbot instead of the stand-in")
+    args = parser.parse_args(argv)
+
+    if args.live:
+        from main import create_chatbot
+
+        chatbot = create_chatbot()
+        paths = {"generate": chatbot.generate}
+    else:
+        paths = {
+            "stdout_capture": lambda q: capture_stdout_answer(StandInAgent(args.latency), q),
+            "generate_answer": lambda q: generate_answer(StandInAgent(args.latency), q),
+        }
+
+    print(f"{'path':<16} {'sessions':>8} {'wall (s)':>10} {'req/s':>10}")
+    for name, answer in paths.items():
+        for sessions in args.sessions:
+            result = run_load(answer, args.requests, sessions)
+            print(f"{name:<16} {sessions:>8} {result['wall_time']:>10.3f} {result['throughput']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
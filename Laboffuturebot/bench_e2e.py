@@ -0,0 +1,479 @@
+"""
+End-to-end benchmark of LabOFutureChatbot.get_response, fully offline.
+
+The production pipeline runs against deterministic local stand-ins:
+
+  embedder       HashingEmbedder, signed feature hashing of word tokens
+  vector store   the "local" memory-mapped NumPy index (vector_store.py),
+                 built from laboffuture_chunks.csv in a scratch directory
+  semantic cache InMemorySemanticCache, same lookup rules as the pgvector
+                 SemanticCache (persona, context-tag overlap, threshold)
+  model          StandInAgent, answers from the context after --llm-latency s
+
+BM25 fusion, chunk store, fallback handling, conversation logging and the
+PerformanceMonitor spans are the real code. The query corpus is cut from
+the chunk CSV (seeded): fresh questions, repeats with other case and
+spacing (semantic cache hits) and off-topic questions (fallbacks).
+
+Each --concurrency level starts from an empty cache and reports
+throughput, p50/p95/p99 per stage (the PerformanceMonitor operation
+names), answer sources and cache hit rate. A separate sequential pass
+over --alloc-queries queries runs under tracemalloc and reports, per
+stage, net allocated blocks, net bytes and peak bytes (nested stages
+included in their parent). Results are saved as JSON; --compare prints
+the change against an earlier file and --fail-over exits non-zero when
+any query_processing p95 regressed by more than that many percent.
+
+    python bench_e2e.py --queries 500 --concurrency 1 4 --out bench_e2e.json
+    python bench_e2e.py --compare bench_e2e.json --fail-over 20
+"""
+import argparse
+import csv
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from agno.embedder.base import Embedder
+
+from fallback_handler import create_fallback_handler
+from knowledge_base import create_knowledge_base
+from main import LabOFutureChatbot
+from semantic_cache import get_context_tagger
+from system_prompts import get_system_prompts
+from utils import get_performance_monitor, load_config
+
+OFF_TOPIC_QUERIES = [
+    "What's the weather like in Dubai today?",
+    "Latest news about the elections",
+    "Which stock should I buy this week?",
+    "Give me medical advice for a headache",
+    "Recommend a good movie for tonight",
+    "Who won the football match yesterday?",
+]
+
+QUESTION_TEMPLATES = [
+    "What is {}?",
+    "Tell me about {}",
+    "How does {} work?",
+    "Can you explain {}",
+    "{}",
+]
+
+
+@dataclass
+class HashingEmbedder(Embedder):
+    """Deterministic offline embedder: signed hashing of lower-cased word tokens."""
+
+    dimensions: int = 256
+
+    def get_embedding(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+
+class StandInAgent:
+    """Model stand-in: sleeps like a model call and answers from its context."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.model = SimpleNamespace(id="stand-in")
+
+    def _answer(self, message: str) -> str:
+        time.sleep(self.latency)
+        context, _, question = message.rpartition("Question:")
+        words = re.sub(r"\[\d+\]|Source: \S+", " ", context).split()
+        return f"About {question.strip()}: " + " ".join(words[-60:])
+
+    def run(self, message: str, stream: bool = False):
+        text = self._answer(message)
+        if stream:
+            return (SimpleNamespace(content=word + " ") for word in text.split())
+        return SimpleNamespace(content=text, run_id=None, metrics={})
+
+
+class InMemorySemanticCache:
+    """SemanticCache stand-in: the same hit rules over NumPy arrays."""
+
+    def __init__(self, embed, similarity_threshold: float = 0.92):
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.tagger = get_context_tagger()
+        self.engine = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # persona -> normalized query -> entry, like the (persona, lower(btrim(query))) key
+            self._entries: Dict[str, Dict[str, Any]] = defaultdict(dict)
+            self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, persona: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(persona, {"hits": 0, "misses": 0, "bypassed": 0})
+            counters[outcome] += 1
+
+    def lookup(self, query: str, persona: str, embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        if embedding is None:
+            embedding = self.embed(query)
+        tags = set(self.tagger.extract_tags(query))
+        vector = np.asarray(embedding, dtype=np.float32)
+
+        best, best_score = None, self.similarity_threshold
+        with self._lock:
+            entries = list(self._entries[persona].values())
+        for entry_vector, entry_tags, text in entries:
+            if tags and not tags & entry_tags:
+                continue
+            score = float(vector @ entry_vector)
+            if score >= best_score:
+                best, best_score = text, score
+
+        if best is None:
+            self._count(persona, "misses")
+            return {"text": None, "score": 0.0, "embedding": embedding}
+        self._count(persona, "hits")
+        return {"text": best, "score": best_score, "embedding": embedding}
+
+    def store(self, query: str, persona: str, response_text: str, embedding: Optional[List[float]] = None) -> None:
+        if embedding is None:
+            embedding = self.embed(query)
+        entry = (np.asarray(embedding, dtype=np.float32), set(self.tagger.extract_tags(query)), response_text)
+        with self._lock:
+            self._entries[persona][query.strip().lower()] = entry
+
+    def invalidate(self) -> int:
+        with self._lock:
+            removed = sum(len(entries) for entries in self._entries.values())
+            self._entries.clear()
+        return removed
+
+    def record_bypass(self, persona: str) -> None:
+        self._count(persona, "bypassed")
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stats = {}
+            for persona, counters in self._stats.items():
+                lookups = counters["hits"] + counters["misses"]
+                stats[persona] = dict(counters, hit_rate=counters["hits"] / lookups if lookups else 0.0)
+            return stats
+
+
+class BenchChatbot(LabOFutureChatbot):
+    """LabOFutureChatbot whose agents are StandInAgents."""
+
+    llm_latency = 0.0
+
+    def _build_agent(self, search_knowledge: bool = True):
+        return StandInAgent(self.llm_latency)
+
+
+class StageRecorder:
+    """
+    PerformanceMonitor listener keeping every duration, plus optional
+    per-stage allocation tracking through a wrapped span().
+    """
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.allocations: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        self._alloc_stack: List[Dict[str, int]] = []
+        self._span = monitor.span
+        monitor.add_listener(self.record)
+
+    def record(self, operation: str, duration: float) -> None:
+        with self._lock:
+            self.durations[operation].append(duration)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.durations = defaultdict(list)
+
+    @contextmanager
+    def _traced_span(self, operation: str):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._alloc_stack:
+            # Keep the parent's peak before resetting it for this stage
+            self._alloc_stack[-1]["peak"] = max(self._alloc_stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame = {"bytes": current, "peak": current, "blocks": sys.getallocatedblocks()}
+        self._alloc_stack.append(frame)
+        try:
+            with self._span(operation) as span:
+                yield span
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self._alloc_stack.pop()
+            frame_peak = max(frame["peak"], peak)
+            if self._alloc_stack:
+                self._alloc_stack[-1]["peak"] = max(self._alloc_stack[-1]["peak"], frame_peak)
+            totals = self.allocations[operation]
+            totals[0] += 1
+            totals[1] += sys.getallocatedblocks() - frame["blocks"]
+            totals[2] += current - frame["bytes"]
+            totals[3] = max(totals[3], frame_peak - frame["bytes"])
+
+    @contextmanager
+    def tracing_allocations(self):
+        """Route the monitor's spans through tracemalloc for the duration."""
+        tracemalloc.start()
+        self.monitor.span = self._traced_span
+        try:
+            yield
+        finally:
+            del self.monitor.span
+            tracemalloc.stop()
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Count, mean and nearest-rank percentiles in milliseconds."""
+    ordered = sorted(durations)
+    if not ordered:
+        return {"count": 0}
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def build_corpus(csv_path: str, count: int, seed: int, repeat_ratio: float, off_topic_ratio: float) -> List[str]:
+    """Seeded questions from chunk word windows, with repeats and off-topic queries mixed in."""
+    csv.field_size_limit(10 ** 8)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        chunks = [(row.get("chunk") or "").strip() for row in csv.DictReader(f)]
+    chunks = [chunk for chunk in dict.fromkeys(chunks) if len(chunk.split()) > 12]
+
+    rng = random.Random(seed)
+    fresh: List[str] = []
+    queries = []
+    for _ in range(count):
+        draw = rng.random()
+        if fresh and draw < repeat_ratio:
+            query = rng.choice(fresh)
+            query = rng.choice([query.lower(), query.upper(), f"  {query} ", query.rstrip("?")])
+        elif draw < repeat_ratio + off_topic_ratio:
+            query = rng.choice(OFF_TOPIC_QUERIES)
+        else:
+            words = rng.choice(chunks).split()
+            start = rng.randrange(0, len(words) - 8)
+            query = rng.choice(QUESTION_TEMPLATES).format(" ".join(words[start:start + rng.randint(3, 8)]))
+            fresh.append(query)
+        queries.append(query)
+    return queries
+
+
+def build_resources(args, workdir: str) -> SimpleNamespace:
+    config = load_config(f"{workdir}/config.json")
+    config.update(log_path=f"{workdir}/conversation_logs", log_conversations=not args.no_log)
+    kb = create_knowledge_base(
+        csv_path=args.csv,
+        db_url="sqlite://",
+        similarity_threshold=config["similarity_threshold"],
+        vector_store="local",
+        index_path=f"{workdir}/vector_index",
+        hybrid_search=config["hybrid_search"],
+        lexical_index_path=f"{workdir}/lexical_index.json",
+        lexical_threshold=config["lexical_threshold"],
+        chunk_store_path=f"{workdir}/chunk_store",
+        embedder=HashingEmbedder(),
+    )
+    return SimpleNamespace(
+        config=config,
+        perf_monitor=get_performance_monitor(),
+        system_prompts=get_system_prompts(),
+        kb=kb,
+        fallback_handler=create_fallback_handler(education_focused=True),
+        semantic_cache=InMemorySemanticCache(kb.embed_query, config["semantic_cache_threshold"]),
+        metrics=None,
+    )
+
+
+def run_level(resources, recorder: StageRecorder, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    resources.semantic_cache.reset()
+    recorder.reset()
+    sessions = threading.local()
+    sources: Counter = Counter()
+    sources_lock = threading.Lock()
+
+    def ask(query: str):
+        chatbot = getattr(sessions, "chatbot", None)
+        if chatbot is None:
+            chatbot = sessions.chatbot = BenchChatbot(resources=resources)
+        source = chatbot.get_response(query)["source"]
+        with sources_lock:
+            sources[source] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(ask, queries))
+    elapsed = time.perf_counter() - start
+
+    cache = resources.semantic_cache.get_stats().get(resources.config["default_persona"], {})
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "seconds": elapsed,
+        "throughput_qps": len(queries) / elapsed,
+        "sources": dict(sources),
+        "cache_hit_rate": sources["cache"] / len(queries),
+        "fallback_rate": sources["fallback"] / len(queries),
+        "semantic_cache": cache,
+        "stages": {stage: summarize(values) for stage, values in sorted(recorder.durations.items())},
+    }
+
+
+def run_allocations(resources, recorder: StageRecorder, queries: List[str]) -> Dict[str, Dict[str, float]]:
+    resources.semantic_cache.reset()
+    chatbot = BenchChatbot(resources=resources)
+    with recorder.tracing_allocations():
+        for query in queries:
+            chatbot.get_response(query)
+    return {
+        stage: {
+            "calls": calls,
+            "net_blocks_per_call": blocks / calls,
+            "net_bytes_per_call": nbytes / calls,
+            "peak_bytes": peak,
+        }
+        for stage, (calls, blocks, nbytes, peak) in sorted(recorder.allocations.items())
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    for run in results["runs"]:
+        print(f"\nconcurrency {run['concurrency']}: {run['throughput_qps']:.1f} queries/s, "
+              f"cache hit rate {run['cache_hit_rate']:.1%}, fallback rate {run['fallback_rate']:.1%}, "
+              f"sources {run['sources']}")
+        print(f"  {'stage':<22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, stats in run["stages"].items():
+            print(f"  {stage:<22} {stats['count']:>6} {stats['p50_ms']:>9.3f} "
+                  f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+    if results["allocations"]:
+        print(f"\nallocations over {results['args']['alloc_queries']} queries (tracemalloc, nested stages included)")
+        print(f"  {'stage':<22} {'blocks/call':>12} {'bytes/call':>12} {'peak bytes':>12}")
+        for stage, stats in results["allocations"].items():
+            print(f"  {stage:<22} {stats['net_blocks_per_call']:>12.1f} "
+                  f"{stats['net_bytes_per_call']:>12.0f} {stats['peak_bytes']:>12}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], total_stage: str) -> float:
+    """Print changes against a baseline run; returns the worst p95 regression of total_stage in percent."""
+    print(f"\nagainst {baseline.get('commit') or 'baseline'}:")
+    worst = 0.0
+    previous = {run["concurrency"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        old = previous.get(run["concurrency"])
+        if old is None:
+            continue
+        print(f"  concurrency {run['concurrency']}: throughput {old['throughput_qps']:.1f} -> "
+              f"{run['throughput_qps']:.1f} queries/s ({run['throughput_qps'] / old['throughput_qps'] - 1:+.1%})")
+        for stage, stats in run["stages"].items():
+            old_stats = old["stages"].get(stage)
+            if not old_stats or not old_stats.get("p95_ms"):
+                continue
+            change = stats["p95_ms"] / old_stats["p95_ms"] - 1
+            print(f"    {stage:<22} p95 {old_stats['p95_ms']:>9.3f} -> {stats['p95_ms']:>9.3f} ms ({change:+.1%})")
+            if stage == total_stage:
+                worst = max(worst, change * 100)
+    return worst
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of get_response")
+    parser.add_argument("--csv", default="../laboffuture_chunks.csv")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per stand-in model call")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3)
+    parser.add_argument("--off-topic-ratio", type=float, default=0.1)
+    parser.add_argument("--alloc-queries", type=int, default=100, help="0 skips the tracemalloc pass")
+    parser.add_argument("--no-log", action="store_true", help="Skip conversation logging")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="bench_e2e.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--fail-over", type=float, help="Exit 1 if query_processing p95 regressed by more than this %%")
+    args = parser.parse_args(argv)
+
+    BenchChatbot.llm_latency = args.llm_latency
+    queries = build_corpus(args.csv, args.queries, args.seed, args.repeat_ratio, args.off_topic_ratio)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        resources = build_resources(args, workdir)
+        print(f"Offline pipeline ready in {time.perf_counter() - start:.1f}s: {resources.kb.last_sync}")
+
+        recorder = StageRecorder(resources.perf_monitor)
+        BenchChatbot(resources=resources).get_response("warm up")
+        runs = [run_level(resources, recorder, queries, level) for level in args.concurrency]
+        allocations = run_allocations(resources, recorder, queries[:args.alloc_queries]) if args.alloc_queries else {}
+
+    results = {
+        "benchmark": "Laboffuturebot.get_response",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "runs": runs,
+        "allocations": allocations,
+    }
+    print_report(results)
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            worst = compare(results, json.load(f), "query_processing")
+        if args.fail_over is not None and worst > args.fail_over:
+            print(f"query_processing p95 regressed by {worst:.1f}% (limit {args.fail_over}%)")
+            status = 1
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {args.out}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
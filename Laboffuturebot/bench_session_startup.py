@@ -0,0 +1,43 @@
+"""
+Session startup benchmark.
+
+Times creating chatbot sessions the old way (every session loads its own
+config, PgVector engine and knowledge base) against sessions that reuse
+the process-wide ChatbotResources. Needs the configured database.
+
+Usage:
+    python bench_session_startup.py --sessions 5
+"""
+import argparse
+import time
+from typing import List
+
+from main import create_chatbot
+
+
+def time_sessions(sessions: int, shared: bool) -> List[float]:
+    """Create sessions one after another and return each startup time."""
+    durations = []
+    for _ in range(sessions):
+        start = time.perf_counter()
+        create_chatbot(shared=shared)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Compare per-session and shared chatbot startup")
+    parser.add_argument("--sessions", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    for label, shared in (("per-session (before)", False), ("shared (after)", True)):
+        durations = time_sessions(args.sessions, shared)
+        print(
+            f"{label:<22} first {durations[0] * 1000:9.1f} ms   "
+            f"mean {sum(durations) / len(durations) * 1000:9.1f} ms   "
+            f"rest mean {sum(durations[1:]) / max(len(durations) - 1, 1) * 1000:9.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
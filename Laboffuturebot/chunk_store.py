@@ -0,0 +1,142 @@
+"""
+Chunk text store for the Lab o Future knowledge base.
+Maps vector DB document ids to chunk text and source URLs without a
+database round trip.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from lexical_index import corpus_signature
+
+
+class ChunkStore:
+    """
+    Array-backed id -> (chunk, urls) table.
+
+    All chunk texts are concatenated into one UTF-8 blob with an int64
+    offsets array, and ids map to row numbers through a dict, so a lookup
+    is one dict access and one slice. Persisted as <path>.bin (the blob)
+    and <path>.json (ids, urls, offsets and a signature).
+    """
+
+    def __init__(self, ids: List[str], urls: List[List[str]], offsets: np.ndarray, blob: bytes, signature: str):
+        self.ids = ids
+        self.urls = urls
+        self.offsets = offsets
+        self.blob = blob
+        self.signature = signature
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def signature_for(chunks: Dict[str, Dict[str, Any]]) -> str:
+        """Fingerprint of chunk ids and their URLs, so URL-only changes also rebuild."""
+        return corpus_signature(f"{chunk_id}\t{' '.join(chunk['urls'])}" for chunk_id, chunk in chunks.items())
+
+    @classmethod
+    def build(cls, chunks: Dict[str, Dict[str, Any]]) -> "ChunkStore":
+        """
+        Build the store from ingest chunks.
+
+        Args:
+            chunks: Mapping of chunk id to {'content': str, 'urls': list} (see ingest.read_chunks)
+
+        Returns:
+            Populated ChunkStore
+        """
+        ids = list(chunks)
+        encoded = [chunks[chunk_id]["content"].encode("utf-8") for chunk_id in ids]
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        return cls(
+            ids=ids,
+            urls=[chunks[chunk_id]["urls"] for chunk_id in ids],
+            offsets=offsets,
+            blob=b"".join(encoded),
+            signature=cls.signature_for(chunks),
+        )
+
+    def get(self, chunk_id: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Look up one chunk.
+
+        Args:
+            chunk_id: Document id from the vector DB
+
+        Returns:
+            (chunk text, source URLs), or None if the id is unknown
+        """
+        row = self.rows.get(chunk_id)
+        if row is None:
+            return None
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.blob[start:end].decode("utf-8"), self.urls[row]
+
+    def get_many(self, chunk_ids: Iterable[str]) -> Dict[str, Tuple[str, List[str]]]:
+        """
+        Look up a whole result set at once.
+
+        Args:
+            chunk_ids: Document ids from the vector DB
+
+        Returns:
+            Mapping of each known id to (chunk text, source URLs)
+        """
+        found = {}
+        for chunk_id in chunk_ids:
+            entry = self.get(chunk_id)
+            if entry is not None:
+                found[chunk_id] = entry
+        return found
+
+    def save(self, path: str) -> None:
+        """Persist the store (both files written atomically)."""
+        with open(f"{path}.bin.tmp", "wb") as f:
+            f.write(self.blob)
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "signature": self.signature,
+                "ids": self.ids,
+                "urls": self.urls,
+                "offsets": self.offsets.tolist(),
+            }, f)
+        os.replace(f"{path}.bin.tmp", f"{path}.bin")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ChunkStore"]:
+        """
+        Load a persisted store.
+
+        Args:
+            path: Path prefix passed to save()
+
+        Returns:
+            ChunkStore, or None if it has not been built yet
+        """
+        if not Path(f"{path}.json").exists() or not Path(f"{path}.bin").exists():
+            return None
+
+        with open(f"{path}.json", encoding="utf-8") as f:
+            header = json.load(f)
+        with open(f"{path}.bin", "rb") as f:
+            blob = f.read()
+
+        offsets = np.asarray(header["offsets"], dtype=np.int64)
+        if offsets[-1] != len(blob):
+            # Blob and header come from different writes; rebuild on next sync
+            return None
+
+        return cls(
+            ids=header["ids"],
+            urls=header["urls"],
+            offsets=offsets,
+            blob=blob,
+            signature=header["signature"],
+        )
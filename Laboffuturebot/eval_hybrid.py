@@ -0,0 +1,223 @@
+"""
+Hybrid retrieval evaluation.
+
+Builds questions about every programme page in the chunk CSV (course
+names come from the page slugs, e.g. galactic-mechanics -> "Galactic
+Mechanics") plus a set of off-topic control questions, then runs
+EnhancedCSVKnowledge.query with vector-only and hybrid retrieval.
+
+Reports, per mode:
+- fallback rate: share of questions the chatbot would hand to the
+  FallbackHandler because nothing passed the relevance thresholds
+- hit@k: share of in-scope questions with a chunk from the right page
+  in the top k
+- mean search latency
+
+--lexical-only skips the vector database and evaluates the BM25 index
+by itself. --offline runs both modes against the local vector store in a
+temporary directory with bench_e2e's hashing embedder, so no database or
+API key is needed (its vector scores are not those of a real model).
+
+Relative paths in the config are found from any working directory.
+
+Usage:
+    python eval_hybrid.py
+    python eval_hybrid.py --lexical-only
+    python eval_hybrid.py --offline
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from ingest import read_chunks
+from lexical_index import BM25Index
+from utils import load_config
+
+# Slugs that are forms, account pages or listings rather than programmes
+SKIPPED_PAGES = {
+    "", "blogs", "contact", "contactus", "jobs", "newsletter", "refund-policy",
+    "shop", "web", "lof-community",
+}
+
+TEMPLATES = [
+    "Tell me about {name}",
+    "What do students learn in {name}?",
+    "How can my child join {name}?",
+]
+
+OFF_TOPIC = [
+    "Who won the cricket world cup last year?",
+    "What is the weather in Chennai today?",
+    "Give me a recipe for chocolate cake",
+    "What is the stock price of Tesla?",
+    "Recommend a good action movie",
+    "How do I fix a flat bicycle tyre?",
+    "Translate good morning into French",
+    "What is the capital of Australia?",
+    # Share a term with the knowledge base
+    "What is the weather in Dubai?",
+    "Robotics weather forecast",
+    "Best space movies to watch this weekend",
+    "How much is a flight to India?",
+]
+
+
+def resolve_path(path: str, config_path: str) -> str:
+    """Find a config-relative path: as given, next to the config file, or one level up."""
+    base = Path(config_path).resolve().parent
+    for candidate in (Path(path), base / path, base.parent / path):
+        if candidate.exists():
+            return str(candidate)
+    return path
+
+
+def page_name(url: str) -> Optional[str]:
+    """Turn a programme page URL into its display name, or None for other pages."""
+    parsed = urlparse(url)
+    if parsed.fragment:
+        return None
+    parts = [part for part in parsed.path.split("/") if part]
+    if len(parts) != 1 or parts[0] in SKIPPED_PAGES or parts[0].endswith("-form"):
+        return None
+    words = [word for word in parts[0].split("-") if not word.isdigit()]
+    return " ".join(word.capitalize() for word in words)
+
+
+def build_questions(chunks: Dict[str, Dict[str, Any]]) -> List[Tuple[str, set]]:
+    """
+    Build in-scope questions with the ids of the chunks from their page.
+
+    Returns:
+        List of (question, relevant chunk ids)
+    """
+    pages: Dict[str, set] = {}
+    for chunk_id, chunk in chunks.items():
+        for url in chunk["urls"]:
+            name = page_name(url)
+            if name:
+                pages.setdefault(name, set()).add(chunk_id)
+
+    return [
+        (template.format(name=name), ids)
+        for name, ids in sorted(pages.items())
+        for template in TEMPLATES
+    ]
+
+
+def evaluate(search, questions: List[Tuple[str, set]], off_topic: List[str]) -> Dict[str, float]:
+    """
+    Run a search function over the question sets.
+
+    Args:
+        search: Callable(question) -> (ranked chunk ids, is_relevant)
+        questions: In-scope questions with relevant chunk ids
+        off_topic: Questions the chatbot should decline
+
+    Returns:
+        Fallback rates, hit@k and latency
+    """
+    latencies = []
+    in_scope_fallbacks = 0
+    hits = 0
+    for question, relevant in questions:
+        start = time.perf_counter()
+        ranked, is_relevant = search(question)
+        latencies.append(time.perf_counter() - start)
+        in_scope_fallbacks += not is_relevant
+        hits += bool(relevant.intersection(ranked))
+
+    off_topic_fallbacks = 0
+    for question in off_topic:
+        _, is_relevant = search(question)
+        off_topic_fallbacks += not is_relevant
+
+    return {
+        "in_scope_fallback_rate": in_scope_fallbacks / len(questions),
+        "off_topic_fallback_rate": off_topic_fallbacks / len(off_topic),
+        "hit_at_k": hits / len(questions),
+        "mean_latency_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+def print_result(label: str, result: Dict[str, float]):
+    print(
+        f"{label:<14} {result['in_scope_fallback_rate']:>16.1%} {result['off_topic_fallback_rate']:>17.1%} "
+        f"{result['hit_at_k']:>7.1%} {result['mean_latency_ms']:>11.3f}"
+    )
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Compare vector-only and hybrid retrieval")
+    parser.add_argument("--config", default=str(Path(__file__).with_name("config.json")))
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--lexical-only", action="store_true", help="Evaluate the BM25 index without the vector DB")
+    parser.add_argument("--offline", action="store_true", help="Local vector store and hashing embedder in a temp dir")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    csv_path = resolve_path(config["csv_path"], args.config)
+    chunks = read_chunks(csv_path)
+    questions = build_questions(chunks)
+    print(f"{len(chunks)} chunks, {len(questions)} in-scope and {len(OFF_TOPIC)} off-topic questions\n")
+    print(f"{'mode':<14} {'in-scope fallback':>16} {'off-topic fallback':>17} {'hit@k':>7} {'latency ms':>11}")
+
+    if args.lexical_only:
+        index = BM25Index.build(chunks)
+        threshold = config.get("lexical_threshold", 0.7)
+
+        def lexical_search(question):
+            results, coverage = index.search(question, args.top_k)
+            return [doc_id for doc_id, _ in results], coverage >= threshold
+
+        print_result("bm25", evaluate(lexical_search, questions, OFF_TOPIC))
+        return
+
+    from knowledge_base import create_knowledge_base
+
+    paths = {
+        "index_path": config.get("vector_index_path", "vector_index"),
+        "lexical_index_path": config.get("lexical_index_path", "lexical_index.json"),
+        "chunk_store_path": config.get("chunk_store_path", "chunk_store"),
+    }
+    vector_store, embedder = config.get("vector_store", "pgvector"), None
+    if args.offline:
+        from bench_e2e import HashingEmbedder
+
+        workdir = tempfile.mkdtemp(prefix="eval_hybrid_")
+        paths = {key: f"{workdir}/{Path(value).name}" for key, value in paths.items()}
+        vector_store, embedder = "local", HashingEmbedder()
+
+    kb = create_knowledge_base(
+        csv_path=csv_path,
+        db_url=config["db_url"],
+        similarity_threshold=config["similarity_threshold"],
+        vector_store=vector_store,
+        hybrid_search=True,
+        lexical_threshold=config.get("lexical_threshold", 0.7),
+        embedder=embedder,
+        **paths,
+    )
+    kb.knowledge_base.num_documents = args.top_k
+    lexical_index = kb.lexical_index
+
+    # Embed each question up front so both modes time only the search
+    embeddings = {
+        question: kb.embed_query(question)
+        for question in [question for question, _ in questions] + OFF_TOPIC
+    }
+
+    def kb_search(question):
+        documents, is_relevant = kb.query(question, query_embedding=embeddings[question])
+        return [doc["id"] for doc in documents], is_relevant
+
+    for label, index in (("vector", None), ("hybrid", lexical_index)):
+        kb.lexical_index = index
+        print_result(label, evaluate(kb_search, questions, OFF_TOPIC))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Incremental ingest for the Lab o Future knowledge base.
+Hashes every CSV chunk and only embeds what changed since the last run.
+"""
+import csv
+import hashlib
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+from sqlalchemy import select, delete, update
+
+from agno.document import Document
+
+
+def hash_chunk(chunk: str) -> str:
+    """
+    Create a stable content hash for a chunk of text.
+
+    Args:
+        chunk: Chunk text from the CSV
+
+    Returns:
+        Hex digest used as the vector DB document id
+    """
+    normalized = " ".join(chunk.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def read_chunks(csv_path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the chunk CSV and collapse duplicate chunk texts.
+
+    Many pages share the same navigation and footer text, so identical
+    chunks are stored once and remember every URL they appeared on.
+
+    Args:
+        csv_path: Path to a CSV with 'url' and 'chunk' columns
+
+    Returns:
+        Mapping of chunk hash to {'content': str, 'urls': sorted list of URLs}
+    """
+    csv.field_size_limit(10 ** 8)
+    chunks: Dict[str, Dict[str, Any]] = {}
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            content = (row.get("chunk") or "").strip()
+            if not content:
+                continue
+
+            chunk_id = hash_chunk(content)
+            entry = chunks.setdefault(chunk_id, {"content": content, "urls": set()})
+            entry["urls"].add((row.get("url") or "").strip())
+
+    for entry in chunks.values():
+        entry["urls"] = sorted(url for url in entry["urls"] if url)
+
+    return chunks
+
+
+class IncrementalIngestor:
+    """
+    Keeps a vector store in sync with the chunk CSV using content hashes.
+
+    Only chunks whose hash is not yet in the table are embedded. Chunks whose
+    text is unchanged but whose URL list moved get a metadata-only update,
+    and rows whose chunk disappeared from the CSV are deleted.
+
+    Works against a PgVector table directly, or against any vector DB that
+    exposes existing_meta / delete_ids / update_meta (see LocalVectorDb).
+    A vector DB with a batch() context manager gets all of a sync's writes
+    in one batch.
+    """
+
+    def __init__(self, vector_db, batch_size: int = 100):
+        """
+        Initialize the ingestor.
+
+        Args:
+            vector_db: agno PgVector or LocalVectorDb backing the knowledge base
+            batch_size: Number of documents embedded and upserted per batch
+        """
+        self.vector_db = vector_db
+        self.batch_size = batch_size
+
+    def _existing_rows(self) -> Dict[str, List[str]]:
+        """Return the URL list stored for every document id in the table."""
+        if hasattr(self.vector_db, "existing_meta"):
+            return {doc_id: meta.get("urls", []) for doc_id, meta in self.vector_db.existing_meta().items()}
+
+        table = self.vector_db.table
+        with self.vector_db.Session() as sess:
+            rows = sess.execute(select(table.c.id, table.c.meta_data)).fetchall()
+
+        return {row[0]: (row[1] or {}).get("urls", []) for row in rows}
+
+    def _delete_rows(self, ids: Set[str]) -> None:
+        """Delete the given document ids from the table."""
+        if hasattr(self.vector_db, "delete_ids"):
+            self.vector_db.delete_ids(ids)
+            return
+
+        table = self.vector_db.table
+        with self.vector_db.Session() as sess, sess.begin():
+            sess.execute(delete(table).where(table.c.id.in_(list(ids))))
+
+    def _update_urls(self, urls_by_id: Dict[str, List[str]]) -> None:
+        """Rewrite the URL metadata of unchanged chunks without re-embedding them."""
+        if hasattr(self.vector_db, "update_meta"):
+            self.vector_db.update_meta({chunk_id: {"urls": urls} for chunk_id, urls in urls_by_id.items()})
+            return
+
+        table = self.vector_db.table
+        with self.vector_db.Session() as sess, sess.begin():
+            for chunk_id, urls in urls_by_id.items():
+                sess.execute(
+                    update(table)
+                    .where(table.c.id == chunk_id)
+                    .values(meta_data={"urls": urls}, name=urls[0] if urls else None)
+                )
+
+    def sync(self, csv_path: Path, chunks: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, int]:
+        """
+        Bring the vector table in line with the CSV.
+
+        Args:
+            csv_path: Path to the chunk CSV
+            chunks: Result of read_chunks(csv_path) if the caller already has it
+
+        Returns:
+            Counts of unique chunks and of chunks added, updated, deleted, unchanged
+        """
+        if not self.vector_db.exists():
+            self.vector_db.create()
+
+        if chunks is None:
+            chunks = read_chunks(csv_path)
+        existing = self._existing_rows()
+
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing]
+        stale_ids = set(existing) - set(chunks)
+        moved = {
+            chunk_id: chunks[chunk_id]["urls"]
+            for chunk_id in chunks
+            if chunk_id in existing and existing[chunk_id] != chunks[chunk_id]["urls"]
+        }
+
+        write_batch = getattr(self.vector_db, "batch", nullcontext)
+        with write_batch():
+            # Embed and upsert only the chunks that are not in the table yet
+            for start in range(0, len(new_ids), self.batch_size):
+                batch = [
+                    Document(
+                        id=chunk_id,
+                        name=chunks[chunk_id]["urls"][0] if chunks[chunk_id]["urls"] else None,
+                        content=chunks[chunk_id]["content"],
+                        meta_data={"urls": chunks[chunk_id]["urls"]},
+                    )
+                    for chunk_id in new_ids[start:start + self.batch_size]
+                ]
+                self.vector_db.upsert(batch)
+
+            if moved:
+                self._update_urls(moved)
+
+            if stale_ids:
+                self._delete_rows(stale_ids)
+
+        return {
+            "chunks": len(chunks),
+            "added": len(new_ids),
+            "updated": len(moved),
+            "deleted": len(stale_ids),
+            "unchanged": len(chunks) - len(new_ids) - len(moved),
+        }
@@ -2,12 +2,22 @@
 Knowledge base module for Lab o Future chatbot.
 Handles CSV knowledge retrieval and vector database operations.
 """
+import time
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Any
 
+from sqlalchemy import select
+
+from agno.embedder.base import Embedder
 from agno.knowledge.csv import CSVKnowledgeBase
 from agno.vectordb.pgvector import PgVector
 
+from chunk_store import ChunkStore
+from ingest import IncrementalIngestor, read_chunks
+from lexical_index import BM25Index, corpus_signature, reciprocal_rank_fusion
+from utils import get_performance_monitor
+from vector_store import LocalVectorDb
+
 
 class EnhancedCSVKnowledge:
     """Enhanced knowledge base with additional functionality for relevance checking and metadata."""
@@ -19,7 +29,14 @@ class EnhancedCSVKnowledge:
         table_name: str = "csv_documents",
         num_documents: int = 5,
         similarity_threshold: float = 0.7,
-        recreate_index: bool = False
+        recreate_index: bool = False,
+        vector_store: str = "pgvector",
+        index_path: str = "vector_index",
+        hybrid_search: bool = True,
+        lexical_index_path: str = "lexical_index.json",
+        lexical_threshold: float = 0.7,
+        chunk_store_path: str = "chunk_store",
+        embedder: Optional[Embedder] = None
     ):
         """
         Initialize the enhanced knowledge base.
@@ -31,31 +48,93 @@ class EnhancedCSVKnowledge:
             num_documents: Number of chunks to retrieve per query
             similarity_threshold: Minimum similarity score to consider a result relevant
             recreate_index: Whether to recreate the vector index
+            vector_store: "pgvector" or "local" (memory-mapped NumPy index)
+            index_path: Directory of the local index when vector_store is "local"
+            hybrid_search: Fuse BM25 results with the vector results
+            lexical_index_path: File the BM25 index is persisted to
+            lexical_threshold: Minimum BM25 query coverage to consider a result relevant
+            chunk_store_path: Path prefix of the id -> chunk text store
+            embedder: agno embedder for chunks and queries (the vector DB's default when omitted)
         """
         self.csv_path = Path(csv_path)
+        self.db_url = db_url
         self.similarity_threshold = similarity_threshold
+        self.last_sync: Optional[Dict[str, int]] = None
+        self.hybrid_search = hybrid_search
+        self.lexical_index_path = lexical_index_path
+        self.lexical_threshold = lexical_threshold
+        self.lexical_index: Optional[BM25Index] = BM25Index.load(lexical_index_path) if hybrid_search else None
+        self.chunk_store_path = chunk_store_path
+        self.chunk_store: Optional[ChunkStore] = ChunkStore.load(chunk_store_path)
+
+        if vector_store == "local":
+            vector_db = LocalVectorDb(path=index_path, embedder=embedder)
+        elif vector_store == "pgvector":
+            vector_db = PgVector(
+                table_name=table_name,
+                db_url=db_url,
+                embedder=embedder,
+            )
+        else:
+            raise ValueError(f"Unknown vector store: {vector_store}")
 
         # Initialize underlying knowledge base
         self.knowledge_base = CSVKnowledgeBase(
             path=self.csv_path,
-            vector_db=PgVector(
-                table_name=table_name,
-                db_url=db_url,
-            ),
+            vector_db=vector_db,
             num_documents=num_documents,
         )
 
-        # Load or recreate the knowledge base index
-        self.knowledge_base.load(recreate=recreate_index)
+        # Sync the vector table with the CSV, embedding only new chunks
+        self.ingestor = IncrementalIngestor(self.knowledge_base.vector_db)
+        self.update_index(recreate=recreate_index)
 
-    def update_index(self, recreate: bool = True):
+    def update_index(self, recreate: bool = False) -> Dict[str, int]:
         """
         Update the knowledge base index.
 
+        Chunks are keyed by a hash of their text, so a normal update only
+        embeds new chunks and deletes rows whose chunk left the CSV. The
+        chunk store and BM25 index are rebuilt only when the chunks changed.
+
+        Args:
+            recreate: Whether to drop the table and re-embed everything
+
+        Returns:
+            Ingest counts (chunks, added, updated, deleted, unchanged)
+        """
+        if recreate:
+            self.knowledge_base.vector_db.drop()
+
+        chunks = read_chunks(self.csv_path)
+        self.last_sync = self.ingestor.sync(self.csv_path, chunks=chunks)
+
+        if recreate or self.chunk_store is None or self.chunk_store.signature != ChunkStore.signature_for(chunks):
+            self.chunk_store = ChunkStore.build(chunks)
+            self.chunk_store.save(self.chunk_store_path)
+
+        if self.hybrid_search:
+            self._update_lexical_index(chunks, force=recreate)
+
+        return self.last_sync
+
+    def _update_lexical_index(self, chunks: Dict[str, Dict[str, Any]], force: bool = False) -> None:
+        """
+        Rebuild and persist the BM25 index if it does not match the chunks.
+
         Args:
-            recreate: Whether to recreate the index from scratch
+            chunks: Chunks from ingest.read_chunks
+            force: Rebuild even if the persisted index is current
         """
-        self.knowledge_base.load(recreate=recreate)
+        if (
+            not force
+            and self.lexical_index is not None
+            and self.lexical_index.signature == corpus_signature(chunks)
+        ):
+            return
+
+        self.lexical_index = BM25Index.build(chunks)
+        self.lexical_index.save(self.lexical_index_path)
 
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base."""
@@ -70,62 +149,129 @@ class EnhancedCSVKnowledge:
         return {
             "document_count": document_count,
             "last_updated": last_updated,
+            "last_sync": self.last_sync,
         }
 
-    def query(self, query_text: str) -> Tuple[List[Dict], bool]:
+    def embed_query(self, query_text: str) -> List[float]:
+        """
+        Embed a query with the vector DB's embedder.
+
+        Args:
+            query_text: The user's query text
+
+        Returns:
+            Query embedding
+        """
+        with get_performance_monitor().span("query_embedding"):
+            return self.knowledge_base.vector_db.embedder.get_embedding(query_text)
+
+    def query(
+        self,
+        query_text: str,
+        trace: Optional[List[Dict[str, Any]]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[List[Dict], bool]:
         """
         Query the knowledge base and return relevant documents and relevance flag.
 
         Args:
             query_text: The user's query text
+            trace: Optional list that receives one entry per vector/lexical search
+            query_embedding: Embedding of query_text if the caller already has it
 
         Returns:
             Tuple:
-                - List of documents (dict with 'content' and 'score')
-                - Boolean indicating if any result passes similarity threshold
+                - List of documents (dict with 'id', 'content', 'url', 'score'
+                  and 'lexical_score'), in fused rank order when hybrid search is on
+                - Boolean indicating if any result passes the similarity
+                  threshold or the BM25 coverage threshold
         """
+        start = time.perf_counter()
+
         # Step 1: Embed the query using vector_db's embedder
-        query_embedding = self.knowledge_base.vector_db.embedder.embed([query_text])[0]
+        embedded = query_embedding is None
+        if embedded:
+            query_embedding = self.embed_query(query_text)
 
+        # Step 2: Search the vector database for top results
+        top_k = self.knowledge_base.num_documents
+        candidates = top_k * 2 if self.lexical_index is not None else top_k
+        with get_performance_monitor().span("vector_search"):
+            results = self._search_vectors(query_embedding, candidates)
 
+        if trace is not None:
+            trace.append({
+                "operation": "vector_search",
+                "query_embeddings": 1 if embedded else 0,
+                "top_k": candidates,
+                "results": len(results),
+                "duration": time.perf_counter() - start,
+            })
 
+        vector_scores = dict(results)
+        is_relevant = any(score >= self.similarity_threshold for score in vector_scores.values())
+        ranked = [doc_id for doc_id, _ in results][:top_k]
 
-        # Step 2: Search the vector database for top results
-        results = self.knowledge_base.vector_db.search(query_embedding, top_k=self.knowledge_base.num_documents)
-
-        documents = []
-        is_relevant = False
-        threshold = self.similarity_threshold
+        # Step 3: Fuse with BM25 so exact course names are not lost to dense ranking
+        lexical_scores: Dict[str, float] = {}
+        if self.lexical_index is not None:
+            lexical_start = time.perf_counter()
+            with get_performance_monitor().span("lexical_search"):
+                lexical_results, coverage = self.lexical_index.search(query_text, candidates)
+            lexical_scores = dict(lexical_results)
+            ranked = [
+                doc_id for doc_id, _ in reciprocal_rank_fusion(
+                    [[doc_id for doc_id, _ in results], [doc_id for doc_id, _ in lexical_results]]
+                )
+            ][:top_k]
+            is_relevant = is_relevant or coverage >= self.lexical_threshold
 
-        # results is a list of lists of tuples: [[(doc_id, score), ...]]
-        for doc_id, score in results[0]:
-            chunk_text = self._get_chunk_text(doc_id)
-            documents.append({"content": chunk_text, "score": score})
+            if trace is not None:
+                trace.append({
+                    "operation": "lexical_search",
+                    "top_k": candidates,
+                    "results": len(lexical_results),
+                    "coverage": coverage,
+                    "duration": time.perf_counter() - lexical_start,
+                })
 
-            if score >= threshold:
-                is_relevant = True
+        # Step 4: Fetch chunk text and source URLs for the whole result set
+        chunks = self.chunk_store.get_many(ranked) if self.chunk_store is not None else {}
+        documents = []
+        for doc_id in ranked:
+            if doc_id not in chunks:
+                # Index and chunk store disagree until the next update_index()
+                continue
+            content, urls = chunks[doc_id]
+            documents.append({
+                "id": doc_id,
+                "content": content,
+                "url": urls[0] if urls else None,
+                "score": vector_scores.get(doc_id, 0.0),
+                "lexical_score": lexical_scores.get(doc_id, 0.0),
+            })
 
         return documents, is_relevant
 
-    def _get_chunk_text(self, doc_id: int) -> str:
+    def _search_vectors(self, query_embedding: List[float], top_k: int) -> List[Tuple[str, float]]:
         """
-        Retrieve the chunk text by document ID.
-
-        Note: Adjust this method based on how your CSVKnowledgeBase stores documents.
-        The following is an example assuming an attribute or method exists to get the document.
+        Find the nearest chunks to an embedding.
 
         Args:
-            doc_id: Document ID returned from vector DB search
+            query_embedding: Query embedding
+            top_k: Number of results
 
         Returns:
-            The chunk text as string or a placeholder if not found
+            List of (document id, cosine similarity) sorted by descending similarity
         """
-        try:
-            # Example: If CSVKnowledgeBase has 'documents' list or dict attribute
-            return self.knowledge_base.documents[doc_id].page_content
-        except Exception:
-            # Fallback placeholder text if retrieval fails
-            return "[Content unavailable]"
+        vector_db = self.knowledge_base.vector_db
+        if hasattr(vector_db, "search_by_vector"):
+            return vector_db.search_by_vector(query_embedding, top_k)
+
+        distance = vector_db.table.c.embedding.cosine_distance(query_embedding)
+        stmt = select(vector_db.table.c.id, (1 - distance).label("score")).order_by(distance).limit(top_k)
+        with vector_db.Session() as sess:
+            return [(row.id, float(row.score)) for row in sess.execute(stmt)]
 
 
 # Utility function to create knowledge base instance
@@ -133,7 +279,14 @@ def create_knowledge_base(
     csv_path: str,
     db_url: str,
     similarity_threshold: float = 0.7,
-    recreate: bool = False
+    recreate: bool = False,
+    vector_store: str = "pgvector",
+    index_path: str = "vector_index",
+    hybrid_search: bool = True,
+    lexical_index_path: str = "lexical_index.json",
+    lexical_threshold: float = 0.7,
+    chunk_store_path: str = "chunk_store",
+    embedder: Optional[Embedder] = None
 ) -> EnhancedCSVKnowledge:
     """
     Create and initialize the knowledge base.
@@ -143,6 +296,13 @@ def create_knowledge_base(
         db_url: Database connection URL
         similarity_threshold: Minimum similarity score for relevance
         recreate: Whether to recreate the index
+        vector_store: "pgvector" or "local"
+        index_path: Directory of the local index
+        hybrid_search: Fuse BM25 results with the vector results
+        lexical_index_path: File the BM25 index is persisted to
+        lexical_threshold: Minimum BM25 query coverage for relevance
+        chunk_store_path: Path prefix of the id -> chunk text store
+        embedder: agno embedder for chunks and queries
 
     Returns:
         Initialized EnhancedCSVKnowledge instance
@@ -151,5 +311,12 @@ def create_knowledge_base(
         csv_path=csv_path,
         db_url=db_url,
         similarity_threshold=similarity_threshold,
-        recreate_index=recreate
+        recreate_index=recreate,
+        vector_store=vector_store,
+        index_path=index_path,
+        hybrid_search=hybrid_search,
+        lexical_index_path=lexical_index_path,
+        lexical_threshold=lexical_threshold,
+        chunk_store_path=chunk_store_path,
+        embedder=embedder
     )
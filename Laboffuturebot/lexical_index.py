@@ -0,0 +1,209 @@
+"""
+BM25 lexical index over the knowledge base chunks.
+Catches branded course names ("Galactic Mechanics", "IoT Illuminations")
+that dense embeddings tend to misrank.
+"""
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be by can do does for from how i in is it me my
+of on or please tell that the this to us was we what when where which who
+why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase a text and split it into index terms.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        Terms with stopwords removed
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def corpus_signature(chunk_ids) -> str:
+    """Fingerprint of a set of chunk ids, used to tell when the index is stale."""
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """
+    Inverted index with precomputed BM25 weights.
+
+    Each posting stores the final per-document weight of its term, so a
+    query is a handful of dict additions and a heap selection.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.idf: Dict[str, float] = {}
+        self.postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.signature: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, chunks: Dict[str, Dict[str, Any]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Build the index from ingest chunks.
+
+        Args:
+            chunks: Mapping of chunk id to {'content': str, ...} (see ingest.read_chunks)
+            k1: Term frequency saturation
+            b: Document length normalization
+
+        Returns:
+            Populated BM25Index
+        """
+        index = cls(k1=k1, b=b)
+        index.ids = list(chunks)
+        index.signature = corpus_signature(index.ids)
+
+        term_counts = [Counter(tokenize(chunks[chunk_id]["content"])) for chunk_id in index.ids]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+        document_frequency: Counter = Counter()
+        for counts in term_counts:
+            document_frequency.update(counts.keys())
+
+        n = len(index.ids)
+        index.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for doc, (counts, length) in enumerate(zip(term_counts, lengths)):
+            norm = k1 * (1 - b + b * length / avg_length) if avg_length else k1
+            for term, tf in counts.items():
+                docs, weights = postings.setdefault(term, ([], []))
+                docs.append(doc)
+                weights.append(index.idf[term] * tf * (k1 + 1) / (tf + norm))
+        index.postings = postings
+        return index
+
+    def _unseen_idf(self) -> float:
+        n = len(self.ids)
+        return math.log(1 + (n + 0.5) / 0.5)
+
+    def search(self, query: str, top_k: int = 5) -> Tuple[List[Tuple[str, float]], float]:
+        """
+        Rank chunks by BM25 for a query.
+
+        Args:
+            query: Query text
+            top_k: Number of results
+
+        Returns:
+            Tuple:
+                - List of (chunk id, BM25 score) sorted by descending score
+                - Coverage of the best hit in [0, 1]: the share of the query
+                  terms' summed idf carried by the terms it contains, so
+                  missing and unknown terms pull it down
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.ids:
+            return [], 0.0
+
+        scores: Dict[int, float] = {}
+        matched_idf: Dict[int, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf = self.idf[term]
+            for doc, weight in zip(*posting):
+                scores[doc] = scores.get(doc, 0.0) + weight
+                matched_idf[doc] = matched_idf.get(doc, 0.0) + idf
+
+        if not scores:
+            return [], 0.0
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        # Not the BM25 score itself: one saturated term can reach idf * (k1 + 1)
+        # and would let a partial match look complete
+        total_idf = sum(self.idf.get(term, self._unseen_idf()) for term in terms)
+        coverage = min(matched_idf[best[0][0]] / total_idf, 1.0) if total_idf else 0.0
+        return [(self.ids[doc], score) for doc, score in best], coverage
+
+    def save(self, path: str) -> None:
+        """Persist the index as JSON (written atomically)."""
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "signature": self.signature,
+            "ids": self.ids,
+            "idf": self.idf,
+            "postings": self.postings,
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """
+        Load a persisted index.
+
+        Args:
+            path: File written by save()
+
+        Returns:
+            BM25Index, or None if the file does not exist
+        """
+        if not Path(path).exists():
+            return None
+
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        index.signature = data["signature"]
+        index.ids = data["ids"]
+        index.idf = data["idf"]
+        index.postings = {term: (docs, weights) for term, (docs, weights) in data["postings"].items()}
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge ranked id lists with reciprocal rank fusion.
+
+    Args:
+        rankings: Ranked lists of ids, best first
+        k: Rank smoothing constant
+
+    Returns:
+        List of (id, fused score) sorted by descending score
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -2,26 +2,76 @@
 Main module for Lab o Future chatbot.
 Integrates knowledge base, fallback handling, and system prompts.
 """
-import io
-import sys
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional
 
 from agno.agent import Agent
 
 from knowledge_base import create_knowledge_base
+from semantic_cache import create_semantic_cache
 from fallback_handler import create_fallback_handler
 from system_prompts import get_system_prompts
 from utils import load_config, log_conversation, get_performance_monitor
 
 
-class LabOFutureChatbot:
+def generate_answer(agent: Agent, message: str) -> Dict[str, Any]:
     """
-    Main chatbot class that integrates all components.
+    Run an agent and return its answer with run metadata.
+    
+    Uses Agent.run instead of print_response, so nothing is rendered to
+    stdout and concurrent callers never share a process-global stream.
+    
+    Args:
+        agent: Agent to run (should not be shared with another thread mid-run)
+        message: Message to send to the agent
+        
+    Returns:
+        Dictionary with the answer text and generation metadata
+    """
+    start = time.perf_counter()
+    run_response = agent.run(message, stream=False)
+    generation_time = time.perf_counter() - start
+    
+    content = run_response.content if run_response is not None else None
+    model = getattr(agent, "model", None)
+    
+    return {
+        "text": content if isinstance(content, str) else str(content or ""),
+        "metadata": {
+            "run_id": getattr(run_response, "run_id", None),
+            "model": getattr(model, "id", None),
+            "metrics": getattr(run_response, "metrics", None) or {},
+            "generation_time": generation_time
+        }
+    }
+
+
+def stream_answer(agent: Agent, message: str) -> Iterator[str]:
+    """
+    Run an agent in streaming mode and yield answer text as it arrives.
+    
+    Args:
+        agent: Agent to run (should not be shared with another thread mid-run)
+        message: Message to send to the agent
+        
+    Yields:
+        Pieces of the answer text
+    """
+    for chunk in agent.run(message, stream=True):
+        content = getattr(chunk, "content", None)
+        if isinstance(content, str) and content:
+            yield content
+
+
+class ChatbotResources:
+    """
+    Heavy, read-only components shared by every chatbot session in a process.
     """
     
     def __init__(self, config_path: str = "config.json"):
         """
-        Initialize the chatbot with all required components.
+        Load configuration and build the shared components.
         
         Args:
             config_path: Path to configuration file
@@ -33,35 +83,177 @@ class LabOFutureChatbot:
         self.perf_monitor = get_performance_monitor()
         self.system_prompts = get_system_prompts()
         
-        # Initialize knowledge base
-        self.perf_monitor.start("init_knowledge_base")
-        self.kb = create_knowledge_base(
-            csv_path=self.config["csv_path"],
-            db_url=self.config["db_url"],
-            similarity_threshold=self.config["similarity_threshold"]
-        )
-        self.perf_monitor.stop()
+        # Initialize knowledge base (vector DB client, embedder and index sync)
+        with self.perf_monitor.span("init_knowledge_base"):
+            self.kb = create_knowledge_base(
+                csv_path=self.config["csv_path"],
+                db_url=self.config["db_url"],
+                similarity_threshold=self.config["similarity_threshold"],
+                vector_store=self.config.get("vector_store", "pgvector"),
+                index_path=self.config.get("vector_index_path", "vector_index"),
+                hybrid_search=self.config.get("hybrid_search", True),
+                lexical_index_path=self.config.get("lexical_index_path", "lexical_index.json"),
+                lexical_threshold=self.config.get("lexical_threshold", 0.7),
+                chunk_store_path=self.config.get("chunk_store_path", "chunk_store")
+            )
         
         # Initialize fallback handler
         self.fallback_handler = create_fallback_handler(education_focused=True)
         
-        # Initialize agent with default persona
+        # Semantic response cache in front of generation
+        self.semantic_cache = None
+        if self.config.get("semantic_cache_enabled", True):
+            self.semantic_cache = create_semantic_cache(
+                self.kb,
+                similarity_threshold=self.config.get("semantic_cache_threshold", 0.92),
+                ttl_hours=self.config.get("semantic_cache_ttl_hours", 168)
+            )
+            # The startup sync may already have changed the chunks behind cached answers
+            self.invalidate_cache_if_changed(self.kb.last_sync)
+        
+        # Prometheus exporter, only when a scrape port is configured
+        self.metrics = None
+        if self.config.get("metrics_port"):
+            from metrics import get_chatbot_metrics
+            self.metrics = get_chatbot_metrics()
+            self.perf_monitor.add_listener(self.metrics.observe_stage)
+            self.metrics.watch(self)
+            self.metrics.serve(int(self.config["metrics_port"]))
+    
+    def invalidate_cache_if_changed(self, sync_stats: Optional[Dict[str, int]]) -> None:
+        """
+        Drop cached answers when a knowledge base sync added, updated or deleted chunks.
+        
+        Args:
+            sync_stats: Ingest counts returned by update_index
+        """
+        if self.semantic_cache is None or not sync_stats:
+            return
+        if any(sync_stats.get(key) for key in ("added", "updated", "deleted")):
+            self.semantic_cache.invalidate()
+
+
+_shared_resources: Dict[str, ChatbotResources] = {}
+_shared_resources_lock = threading.Lock()
+
+
+def get_shared_resources(config_path: str = "config.json") -> ChatbotResources:
+    """
+    Get the process-wide resources for a configuration file, building them once.
+    
+    Args:
+        config_path: Path to configuration file
+        
+    Returns:
+        Shared ChatbotResources instance
+    """
+    with _shared_resources_lock:
+        if config_path not in _shared_resources:
+            _shared_resources[config_path] = ChatbotResources(config_path)
+        return _shared_resources[config_path]
+
+
+class LabOFutureChatbot:
+    """
+    Main chatbot class that integrates all components.
+    
+    Only conversation state (persona, history) belongs to an instance; the
+    knowledge base, fallback handler and prompts come from ChatbotResources.
+    """
+    
+    def __init__(self, config_path: str = "config.json", resources: Optional[ChatbotResources] = None):
+        """
+        Initialize the chatbot with all required components.
+        
+        Args:
+            config_path: Path to configuration file
+            resources: Shared components; built from config_path when omitted
+        """
+        if resources is None:
+            resources = ChatbotResources(config_path)
+        self.resources = resources
+        
+        # Shared, read-only components
+        self.config = resources.config
+        self.perf_monitor = resources.perf_monitor
+        self.system_prompts = resources.system_prompts
+        self.kb = resources.kb
+        self.fallback_handler = resources.fallback_handler
+        self.semantic_cache = resources.semantic_cache
+        self.metrics = resources.metrics
+        
+        # Start with the default persona
         self.current_persona = self.config["default_persona"]
-        self._init_agent()
+        self._apply_persona()
         
         # Conversation history
         self.conversation_history = []
         
-    def _init_agent(self):
-        """Initialize or reinitialize the agent with current settings."""
-        # Initialize Agno agent (without system prompt as it doesn't support it directly)
-        self.agent = Agent(
+    def _apply_persona(self):
+        """Load the system prompt of the current persona; agents are built per request."""
+        self.current_system_prompt = self.system_prompts.get_prompt(self.current_persona)
+    
+    def _build_agent(self, search_knowledge: bool = True) -> Agent:
+        """
+        Build a fresh agent for a single request.
+        
+        Agents keep per-run state, so each request gets its own instance
+        while the knowledge base behind it is shared.
+        
+        Args:
+            search_knowledge: Whether the agent may search the knowledge base itself
+        """
+        # The persona prompt goes into the agent's system message, so answers
+        # (and the semantic cache entries keyed by persona) differ per persona
+        if not search_knowledge:
+            return Agent(instructions=self.current_system_prompt, search_knowledge=False)
+            
+        return Agent(
+            instructions=self.current_system_prompt,
             knowledge=self.kb.knowledge_base,
             search_knowledge=True,
         )
+    
+    def _build_context_message(self, query: str, documents: List[Dict[str, Any]]) -> str:
+        """
+        Build the generation message from already-retrieved documents.
         
-        # Store current system prompt for use in response generation
-        self.current_system_prompt = self.system_prompts.get_prompt(self.current_persona)
+        Args:
+            query: User's query text
+            documents: Documents returned by the knowledge base search
+            
+        Returns:
+            Message with the retrieved context followed by the question
+        """
+        context = "\n\n".join(
+            f"[{i}] {doc['content']}" + (f"\nSource: {doc['url']}" if doc.get("url") else "")
+            for i, doc in enumerate(documents, 1) if doc.get("content")
+        )
+        return (
+            "Use the following information from the Lab of Future knowledge base "
+            f"to answer the question.\n\n{context}\n\nQuestion: {query}"
+        )
+    
+    def generate(self, query: str, documents: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Generate an answer for a query with the agent.
+        
+        Safe to call from several threads at once.
+        
+        Args:
+            query: User's query text
+            documents: Documents already retrieved for the query. When given they
+                are passed to the model as context and the agent does not search
+                the knowledge base again.
+            
+        Returns:
+            Dictionary with the answer text and generation metadata
+        """
+        if documents is None:
+            return generate_answer(self._build_agent(), query)
+            
+        agent = self._build_agent(search_knowledge=False)
+        return generate_answer(agent, self._build_context_message(query, documents))
     
     def set_persona(self, persona_key: str) -> bool:
         """
@@ -77,57 +269,56 @@ class LabOFutureChatbot:
             return False
             
         self.current_persona = persona_key
-        self._init_agent()
+        self._apply_persona()
         return True
     
-    def get_response(self, query: str) -> Dict[str, Any]:
+    def _retrieve(self, query: str, use_cache: bool = True):
         """
-        Get a response from the chatbot for a user query.
+        Check the semantic cache, then run the single retrieval pass and build
+        the response skeleton.
+        
+        On a cache hit the response already carries the cached text and its
+        source is "cache"; no retrieval or generation is needed.
         
         Args:
             query: User's query text
+            use_cache: Whether to consult the semantic cache
             
         Returns:
-            Response dictionary with text and metadata
+            Tuple of (response dictionary, retrieved documents, relevance flag,
+            query embedding or None)
         """
-        self.perf_monitor.start("query_processing")
-        
-        # Direct interaction with the underlying knowledge base to get documents
-        self.perf_monitor.start("knowledge_search")
-        # Use the vector_db directly since we can't use kb.query
-        documents = self.kb.knowledge_base.query(query)
-        
-        # Extract results and check relevance
-        kb_results = []
-        is_relevant = False
-        max_score = 0
-        
-        for doc in documents:
-            # Extract content and metadata based on what's available
-            content = getattr(doc, 'page_content', None)
-            if content is None and hasattr(doc, 'get'):
-                content = doc.get('content', '')
-                
-            # Extract score from metadata if available
-            score = 0
-            if hasattr(doc, 'metadata'):
-                score = doc.metadata.get('score', 0)
-            elif hasattr(doc, 'get'):
-                score = doc.get('score', 0)
-                
-            kb_results.append({
-                'content': content,
-                'score': score
-            })
-            
-            # Update maximum score and relevance
-            if score > max_score:
-                max_score = score
-                
-            if score >= self.kb.similarity_threshold:
-                is_relevant = True
+        query_embedding = None
+        
+        if self.semantic_cache is not None:
+            if use_cache:
+                with self.perf_monitor.span("cache_lookup"):
+                    cached = self.semantic_cache.lookup(query, self.current_persona)
                 
-        self.perf_monitor.stop()  # Stop knowledge_search timer
+                query_embedding = cached["embedding"]
+                if cached["text"] is not None:
+                    response = {
+                        "text": cached["text"],
+                        "source": "cache",
+                        "persona": self.current_persona,
+                        "metadata": {
+                            "query_time": 0,
+                            "sources": [],
+                            "confidence": cached["score"],
+                            "retrieval": {"searches": 0, "trace": []}
+                        }
+                    }
+                    return response, [], False, query_embedding
+            else:
+                self.semantic_cache.record_bypass(self.current_persona)
+        
+        # Single retrieval pass: these documents decide relevance and feed generation
+        retrieval_trace = []
+        with self.perf_monitor.span("knowledge_search"):
+            kb_results, is_relevant = self.kb.query(
+                query, trace=retrieval_trace, query_embedding=query_embedding
+            )
+        max_score = max((item["score"] for item in kb_results), default=0)
         
         # Prepare the response structure
         response = {
@@ -137,36 +328,34 @@ class LabOFutureChatbot:
             "metadata": {
                 "query_time": 0,
                 "sources": [item['content'][:100] + "..." for item in kb_results if item['content']],
-                "confidence": max_score
+                "confidence": max_score,
+                "retrieval": {
+                    "searches": len(retrieval_trace),
+                    "trace": retrieval_trace
+                }
             }
         }
         
-        # Generate the response text
-        if is_relevant:
-            # Since Agent.print_response prints to stdout, we need to capture it
-            self.perf_monitor.start("agent_response")
-            
-            # Capture stdout to get agent's response
-            original_stdout = sys.stdout
-            captured_output = io.StringIO()
-            sys.stdout = captured_output
-            
-            # Use the agent to generate a response (it prints instead of returning)
-            # We could inject the system prompt here if supported
-            self.agent.print_response(query, markdown=True)
-            
-            # Restore stdout and get the captured output
-            sys.stdout = original_stdout
-            agent_response = captured_output.getvalue()
-            
-            self.perf_monitor.stop()  # Stop agent_response timer
-            
-            response["text"] = agent_response
-        else:
-            # Use fallback handler if no relevant information found
-            fallback_response = self.fallback_handler.get_fallback_response(query)
-            response["text"] = fallback_response["text"]
-            response["metadata"]["suggestions"] = fallback_response.get("suggestions", [])
+        return response, kb_results, is_relevant, query_embedding
+    
+    def _store_in_cache(self, query: str, response: Dict[str, Any], query_embedding, use_cache: bool) -> None:
+        """Cache a freshly generated knowledge-base answer for this persona."""
+        if self.semantic_cache is None or not use_cache:
+            return
+        if response["source"] != "knowledge_base" or not response["text"]:
+            return
+        self.semantic_cache.store(query, self.current_persona, response["text"], embedding=query_embedding)
+    
+    def _apply_fallback(self, query: str, response: Dict[str, Any]) -> None:
+        """Fill the response with a fallback answer when nothing relevant was found."""
+        fallback_response = self.fallback_handler.get_fallback_response(query)
+        response["text"] = fallback_response["text"]
+        response["metadata"]["suggestions"] = fallback_response.get("suggestions", [])
+    
+    def _record(self, query: str, response: Dict[str, Any]) -> None:
+        """Record the finished exchange in the history, metrics and conversation log."""
+        if self.metrics is not None:
+            self.metrics.count_response(response["source"], self.current_persona)
         
         # Record the conversation
         self.conversation_history.append({
@@ -184,12 +373,95 @@ class LabOFutureChatbot:
                     "persona": self.current_persona,
                     "confidence": response["metadata"].get("confidence", 0)
                 },
-                log_dir=self.config.get("log_path", "conversation_logs")
+                log_dir=self.config.get("log_path", "conversation_logs"),
+                compression=self.config.get("log_compression")
             )
+    
+    def get_response(self, query: str, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get a response from the chatbot for a user query.
+        
+        Args:
+            query: User's query text
+            use_cache: Whether to serve from and write to the semantic cache
+            
+        Returns:
+            Response dictionary with text and metadata
+        """
+        with self.perf_monitor.span("query_processing") as query_span:
+            response, kb_results, is_relevant, query_embedding = self._retrieve(query, use_cache)
+            
+            # Generate the response text
+            if response["source"] == "cache":
+                pass  # Served from the semantic cache, nothing to generate
+            elif is_relevant:
+                with self.perf_monitor.span("agent_response"):
+                    generation = self.generate(query, documents=kb_results)
+                
+                response["text"] = generation["text"]
+                response["metadata"]["generation"] = generation["metadata"]
+                self._store_in_cache(query, response, query_embedding, use_cache)
+            else:
+                # Use fallback handler if no relevant information found
+                self._apply_fallback(query, response)
+            
+            self._record(query, response)
+        
+        response["metadata"]["query_time"] = query_span.duration
+        
+        return response
+    
+    def get_response_stream(self, query: str, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get a streaming response from the chatbot for a user query.
         
-        query_time = self.perf_monitor.stop()  # Stop query_processing timer
-        response["metadata"]["query_time"] = query_time
+        Retrieval runs before this returns; the answer text is produced
+        while the caller iterates over response["stream"]. Once the stream
+        is exhausted, response["text"] holds the full answer and the
+        metadata carries time_to_first_token next to query_time.
         
+        Args:
+            query: User's query text
+            use_cache: Whether to serve from and write to the semantic cache
+            
+        Returns:
+            Response dictionary with a "stream" iterator of text pieces
+        """
+        start = time.perf_counter()
+        response, kb_results, is_relevant, query_embedding = self._retrieve(query, use_cache)
+        
+        def token_stream() -> Iterator[str]:
+            pieces = []
+            first_token_time = None
+            
+            if response["source"] == "cache":
+                tokens = iter([response["text"]])
+            elif is_relevant:
+                agent = self._build_agent(search_knowledge=False)
+                tokens = stream_answer(agent, self._build_context_message(query, kb_results))
+            else:
+                self._apply_fallback(query, response)
+                tokens = iter([response["text"]])
+                
+            for token in tokens:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - start
+                    response["metadata"]["time_to_first_token"] = first_token_time
+                pieces.append(token)
+                yield token
+                
+            response["text"] = "".join(pieces)
+            self._store_in_cache(query, response, query_embedding, use_cache)
+            self._record(query, response)
+            
+            query_time = time.perf_counter() - start
+            response["metadata"]["query_time"] = query_time
+            self.perf_monitor.record("query_processing", query_time)
+            if first_token_time is not None:
+                self.perf_monitor.record("time_to_first_token", first_token_time)
+        
+        response["metadata"]["time_to_first_token"] = None
+        response["stream"] = token_stream()
         return response
     
     def get_available_personas(self):
@@ -200,30 +472,43 @@ class LabOFutureChatbot:
         """Get performance statistics."""
         return self.perf_monitor.get_stats()
     
-    def update_knowledge_base(self, recreate: bool = True):
+    def get_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get per-persona semantic cache statistics."""
+        if self.semantic_cache is None:
+            return {}
+        return self.semantic_cache.get_stats()
+    
+    def update_knowledge_base(self, recreate: bool = False) -> Dict[str, int]:
         """
         Update the knowledge base index.
         
         Args:
-            recreate: Whether to recreate the index
+            recreate: Whether to recreate the index instead of syncing changed chunks
+            
+        Returns:
+            Ingest counts from the knowledge base sync
         """
-        self.perf_monitor.start("update_kb")
-        self.kb.update_index(recreate=recreate)
-        self.perf_monitor.stop()
+        with self.perf_monitor.span("update_kb"):
+            sync_stats = self.kb.update_index(recreate=recreate)
+        self.resources.invalidate_cache_if_changed(sync_stats)
+        return sync_stats
 
 
 # Factory function for easy instantiation
-def create_chatbot(config_path: str = "config.json") -> LabOFutureChatbot:
+def create_chatbot(config_path: str = "config.json", shared: bool = True) -> LabOFutureChatbot:
     """
     Create a chatbot instance.
     
     Args:
         config_path: Path to configuration file
+        shared: Reuse the process-wide knowledge base and handlers instead of
+            building a private set
         
     Returns:
         Initialized LabOFutureChatbot
     """
-    return LabOFutureChatbot(config_path=config_path)
+    resources = get_shared_resources(config_path) if shared else None
+    return LabOFutureChatbot(config_path=config_path, resources=resources)
 
 
 if __name__ == "__main__":
@@ -253,9 +538,12 @@ if __name__ == "__main__":
                 print(f"Unknown persona: {persona_key}")
             continue
             
-        # Get and display response
-        response = chatbot.get_response(user_input)
-        print(f"\nBot ({response['source']}): {response['text']}")
+        # Stream the response as it is generated
+        response = chatbot.get_response_stream(user_input)
+        print(f"\nBot ({response['source']}): ", end="", flush=True)
+        for token in response["stream"]:
+            print(token, end="", flush=True)
+        print()
         
         # Show confidence if available
         confidence = response["metadata"].get("confidence", 0)
@@ -0,0 +1,130 @@
+"""
+Prometheus metrics for the Lab o Future chatbot.
+
+Stage latencies come from the PerformanceMonitor: every duration it records
+(cache_lookup, query_embedding, vector_search, lexical_search,
+knowledge_search, agent_response, query_processing, time_to_first_token)
+is also observed into one histogram labelled by stage. Answers are counted
+by source and persona, so cache hit rate and fallback rate are ratios of
+lof_responses_total. Semantic cache counters and the DB connection pool are
+read only when Prometheus scrapes.
+
+Enabled by setting "metrics_port" in config.json; needs the
+prometheus_client package.
+"""
+import threading
+from typing import Any, Dict, List
+
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Seconds; spans cache hits (ms) through slow model calls (tens of s)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _ResourcesCollector:
+    """Semantic cache and connection pool state, read at scrape time."""
+
+    def __init__(self):
+        self.resources: List[Any] = []
+
+    def collect(self):
+        lookups = CounterMetricFamily(
+            "lof_semantic_cache_lookups", "Semantic cache lookups by persona and result",
+            labels=["persona", "result"]
+        )
+        hit_ratio = GaugeMetricFamily(
+            "lof_semantic_cache_hit_ratio", "Semantic cache hits / (hits + misses)", labels=["persona"]
+        )
+        connections = GaugeMetricFamily(
+            "lof_db_pool_connections", "Database connections by pool and state", labels=["pool", "state"]
+        )
+        pool_size = GaugeMetricFamily("lof_db_pool_size", "Configured pool size", labels=["pool"])
+
+        engines = {}
+        for resources in self.resources:
+            cache = resources.semantic_cache
+            if cache is not None:
+                for persona, stats in cache.get_stats().items():
+                    for result in ("hits", "misses", "bypassed"):
+                        lookups.add_metric([persona, result], stats[result])
+                    hit_ratio.add_metric([persona], stats["hit_rate"])
+                engines[id(cache.engine)] = cache.engine
+            engine = getattr(resources.kb.knowledge_base.vector_db, "db_engine", None)
+            if engine is not None:
+                engines[id(engine)] = engine
+
+        for engine in engines.values():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue  # e.g. NullPool / StaticPool
+            name = engine.url.render_as_string(hide_password=True)
+            connections.add_metric([name, "checked_out"], pool.checkedout())
+            connections.add_metric([name, "idle"], pool.checkedin())
+            connections.add_metric([name, "overflow"], max(pool.overflow(), 0))
+            pool_size.add_metric([name], pool.size())
+
+        yield from (lookups, hit_ratio, connections, pool_size)
+
+
+class ChatbotMetrics:
+    """
+    Process-wide Prometheus exporter; use get_chatbot_metrics().
+    """
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "lof_stage_duration_seconds", "Latency of each chatbot stage",
+            ["stage"], buckets=STAGE_BUCKETS
+        )
+        self.responses = Counter(
+            "lof_responses", "Answers by source (cache, knowledge_base, fallback) and persona",
+            ["source", "persona"]
+        )
+        self._stage_children: Dict[str, Any] = {}
+        self._response_children: Dict[tuple, Any] = {}
+        self._collector = _ResourcesCollector()
+        REGISTRY.register(self._collector)
+        self._lock = threading.Lock()
+        self._ports = set()
+
+    def observe_stage(self, stage: str, duration: float) -> None:
+        """PerformanceMonitor listener: one histogram observation per record."""
+        child = self._stage_children.get(stage)
+        if child is None:
+            child = self._stage_children[stage] = self.stage_seconds.labels(stage)
+        child.observe(duration)
+
+    def count_response(self, source: str, persona: str) -> None:
+        """Count one finished answer."""
+        key = (source, persona)
+        child = self._response_children.get(key)
+        if child is None:
+            child = self._response_children[key] = self.responses.labels(source, persona)
+        child.inc()
+
+    def watch(self, resources) -> None:
+        """Export the semantic cache and pool of a ChatbotResources on every scrape."""
+        with self._lock:
+            if resources not in self._collector.resources:
+                self._collector.resources = self._collector.resources + [resources]
+
+    def serve(self, port: int, addr: str = "0.0.0.0") -> None:
+        """Start the /metrics HTTP endpoint on a port (once per port)."""
+        with self._lock:
+            if port not in self._ports:
+                start_http_server(port, addr)
+                self._ports.add(port)
+
+
+_chatbot_metrics = None
+_chatbot_metrics_lock = threading.Lock()
+
+
+def get_chatbot_metrics() -> ChatbotMetrics:
+    """Get the process-wide exporter, creating it on first use."""
+    global _chatbot_metrics
+    with _chatbot_metrics_lock:
+        if _chatbot_metrics is None:
+            _chatbot_metrics = ChatbotMetrics()
+        return _chatbot_metrics
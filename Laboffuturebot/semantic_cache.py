@@ -0,0 +1,273 @@
+"""
+Semantic response cache for the Lab o Future chatbot.
+Serves repeated questions from Postgres instead of calling the LLM again.
+"""
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import (
+    Table, Column, Integer, String, Text, DateTime, MetaData, Index,
+    select, delete, func, text, create_engine
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+# Context tagging and the write-behind usage stats are shared with lof_bot's
+# FAQ cache, so both apps tag queries with one taxonomy
+sys.path.append(str(Path(__file__).resolve().parent.parent / "lof_bot"))
+from faq_cache.context import ContextTagger, get_context_tagger  # noqa: E402
+from faq_cache.stats_writer import WriteBehindStats  # noqa: E402
+
+
+class SemanticCache:
+    """
+    Embedding nearest-neighbour cache keyed by persona.
+
+    A lookup embeds the query once and runs one indexed SELECT that filters
+    by persona and context-tag overlap and orders by cosine distance; hit
+    counts are written behind in batches, so lookups never write.
+    There is one row per persona and normalized question; entries older
+    than ttl_hours are not served, and invalidate() drops everything when
+    the knowledge base changes.
+    """
+
+    def __init__(
+        self,
+        engine,
+        embed,
+        dimensions: int = 1536,
+        similarity_threshold: float = 0.92,
+        table_name: str = "response_cache",
+        ttl_hours: Optional[float] = 168,
+        context_tagger: Optional[ContextTagger] = None,
+        stats_flush_interval: float = 5.0
+    ):
+        """
+        Initialize the cache and create its table if needed.
+
+        Args:
+            engine: SQLAlchemy engine (shared with the vector DB)
+            embed: Callable returning the embedding of a query string
+            dimensions: Embedding dimensions
+            similarity_threshold: Minimum cosine similarity for a cache hit
+            table_name: Table name for cached responses
+            ttl_hours: Age after which an entry is no longer served (None keeps entries forever)
+            context_tagger: Tagger for context tags (default: the shared faq_cache tagger)
+            stats_flush_interval: Seconds between batched frequency/last_accessed writes
+        """
+        self.engine = engine
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.table_name = table_name
+        self.ttl = timedelta(hours=ttl_hours) if ttl_hours else None
+        self.tagger = context_tagger or get_context_tagger()
+        self.metadata = MetaData()
+
+        self.table = Table(
+            table_name,
+            self.metadata,
+            Column("id", Integer, primary_key=True, autoincrement=True),
+            Column("persona", String(64), nullable=False),
+            Column("query_text", Text, nullable=False),
+            Column("response_text", Text, nullable=False),
+            Column("embedding", Vector(dimensions), nullable=False),
+            Column("context_tags", ARRAY(String), nullable=False, default=[]),
+            Column("frequency", Integer, nullable=False, default=1),
+            Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
+            Column("last_accessed", DateTime, nullable=False, default=datetime.utcnow),
+            Index(f"idx_{table_name}_persona", "persona"),
+            Index(
+                f"idx_{table_name}_embedding",
+                "embedding",
+                postgresql_using="hnsw",
+                postgresql_ops={"embedding": "vector_cosine_ops"},
+            ),
+        )
+        # One row per persona and normalized question; store() upserts on this key
+        self.query_key = func.lower(func.btrim(self.table.c.query_text))
+        Index(f"uq_{table_name}_persona_query", self.table.c.persona, self.query_key, unique=True)
+
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        self.metadata.create_all(self.engine)
+        self._add_query_key()
+
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        # Hits bump frequency/last_accessed per row id from a background thread
+        self.stats_writer = WriteBehindStats(
+            self.engine, self.table, "id", flush_interval=stats_flush_interval
+        )
+
+    def _add_query_key(self) -> None:
+        """
+        Add the unique (persona, lower(btrim(query_text))) index to a table
+        created before it existed, keeping the newest row of each duplicate set.
+        """
+        with self.engine.begin() as conn:
+            has_key = conn.execute(
+                text("SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+                {"table": self.table_name, "index": f"uq_{self.table_name}_persona_query"},
+            ).scalar()
+            if has_key:
+                return
+            conn.execute(text(f"""
+            DELETE FROM {self.table_name} t USING {self.table_name} newer
+            WHERE t.persona = newer.persona
+              AND lower(btrim(t.query_text)) = lower(btrim(newer.query_text))
+              AND t.id < newer.id
+            """))
+            conn.execute(text(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_{self.table_name}_persona_query
+            ON {self.table_name} (persona, lower(btrim(query_text)))
+            """))
+
+    def _count(self, persona: str, outcome: str) -> None:
+        """Increment a per-persona counter (hits, misses or bypassed)."""
+        with self._stats_lock:
+            counters = self._stats.setdefault(persona, {"hits": 0, "misses": 0, "bypassed": 0})
+            counters[outcome] += 1
+
+    def lookup(self, query: str, persona: str, embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Look up a cached response for a query and persona.
+
+        Args:
+            query: User's query text
+            persona: Persona key the answer must have been generated for
+            embedding: Query embedding if already computed
+
+        Returns:
+            Dictionary with 'text' (None on a miss), 'score' and the query
+            'embedding' so a miss can reuse it for retrieval
+        """
+        if embedding is None:
+            embedding = self.embed(query)
+        tags = self.tagger.extract_tags(query)
+
+        distance = self.table.c.embedding.cosine_distance(embedding)
+        best_match = (
+            select(self.table.c.id, self.table.c.response_text, (1 - distance).label("score"))
+            .where(self.table.c.persona == persona)
+            .where(distance <= 1 - self.similarity_threshold)
+            .order_by(distance)
+            .limit(1)
+        )
+        if tags:
+            best_match = best_match.where(self.table.c.context_tags.overlap(tags))
+        if self.ttl is not None:
+            best_match = best_match.where(self.table.c.created_at >= datetime.utcnow() - self.ttl)
+
+        with self.engine.connect() as conn:
+            row = conn.execute(best_match).first()
+
+        if row is None:
+            self._count(persona, "misses")
+            return {"text": None, "score": 0.0, "embedding": embedding}
+
+        self._count(persona, "hits")
+        self.stats_writer.record(row.id)
+        return {"text": row.response_text, "score": float(row.score), "embedding": embedding}
+
+    def store(self, query: str, persona: str, response_text: str, embedding: Optional[List[float]] = None) -> None:
+        """
+        Store a generated response, replacing the persona's earlier answer to
+        the same normalized question.
+
+        Args:
+            query: User's query text
+            persona: Persona the response was generated for
+            response_text: Response to cache
+            embedding: Query embedding if already computed
+        """
+        if embedding is None:
+            embedding = self.embed(query)
+        now = datetime.utcnow()
+
+        stmt = pg_insert(self.table).values(
+            persona=persona,
+            query_text=query,
+            response_text=response_text,
+            embedding=embedding,
+            context_tags=self.tagger.extract_tags(query),
+            frequency=1,
+            created_at=now,
+            last_accessed=now,
+        )
+        # A repeated miss (e.g. the old entry expired) refreshes the answer in place
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.persona, self.query_key],
+            set_={
+                "query_text": stmt.excluded.query_text,
+                "response_text": stmt.excluded.response_text,
+                "embedding": stmt.excluded.embedding,
+                "context_tags": stmt.excluded.context_tags,
+                "frequency": self.table.c.frequency + 1,
+                "created_at": now,
+                "last_accessed": now,
+            },
+        )
+
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def invalidate(self) -> int:
+        """
+        Drop every cached response, e.g. after the knowledge base changed.
+
+        Returns:
+            Number of entries removed
+        """
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.table)).rowcount
+
+    def close(self) -> None:
+        """Stop the background stats writer and flush pending hit counts."""
+        self.stats_writer.close()
+
+    def record_bypass(self, persona: str) -> None:
+        """Count a request that skipped the cache."""
+        self._count(persona, "bypassed")
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get per-persona hit statistics.
+
+        Returns:
+            Dictionary of persona to hits, misses, bypassed and hit_rate
+        """
+        with self._stats_lock:
+            stats = {}
+            for persona, counters in self._stats.items():
+                lookups = counters["hits"] + counters["misses"]
+                stats[persona] = dict(counters, hit_rate=counters["hits"] / lookups if lookups else 0.0)
+            return stats
+
+
+def create_semantic_cache(
+    kb, similarity_threshold: float = 0.92, ttl_hours: Optional[float] = 168
+) -> SemanticCache:
+    """
+    Create a semantic cache sharing the knowledge base's engine and embedder.
+
+    Args:
+        kb: EnhancedCSVKnowledge instance
+        similarity_threshold: Minimum cosine similarity for a cache hit
+        ttl_hours: Age after which an entry is no longer served
+
+    Returns:
+        Initialized SemanticCache
+    """
+    vector_db = kb.knowledge_base.vector_db
+    # The local vector store has no engine of its own; the cache still lives in Postgres
+    engine = getattr(vector_db, "db_engine", None) or create_engine(kb.db_url)
+    return SemanticCache(
+        engine=engine,
+        embed=kb.embed_query,
+        dimensions=getattr(vector_db.embedder, "dimensions", None) or 1536,
+        similarity_threshold=similarity_threshold,
+        ttl_hours=ttl_hours,
+    )
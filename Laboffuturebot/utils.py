@@ -1,11 +1,18 @@
 """
 Utility functions for the Lab o Future chatbot.
 """
+import atexit
+import bisect
+import contextvars
+import gzip
 import json
+import math
 import os
+import queue
+import threading
 import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 
 # Configuration and settings management
 def load_config(config_path: str = "config.json") -> Dict[str, Any]:
@@ -24,7 +31,18 @@ def load_config(config_path: str = "config.json") -> Dict[str, Any]:
         "similarity_threshold": 0.7,
         "default_persona": "default",
         "log_conversations": True,
-        "log_path": "conversation_logs"
+        "log_path": "conversation_logs",
+        "semantic_cache_enabled": True,
+        "semantic_cache_threshold": 0.92,
+        "semantic_cache_ttl_hours": 168,
+        "vector_store": "pgvector",
+        "vector_index_path": "vector_index",
+        "hybrid_search": True,
+        "lexical_index_path": "lexical_index.json",
+        "lexical_threshold": 0.7,
+        "chunk_store_path": "chunk_store",
+        "log_compression": None,
+        "metrics_port": None
     }
     
     if not os.path.exists(config_path):
@@ -46,25 +64,237 @@ def load_config(config_path: str = "config.json") -> Dict[str, Any]:
         return default_config
 
 # Conversation logging
+class ConversationLogSink:
+    """
+    Background writer for the daily conversation logs.
+    
+    submit() only enqueues the entry, so logging adds no file I/O to the
+    request path. A worker thread drains the bounded queue in batches
+    through one long-lived file handle, opening a new file when the date
+    changes. When the queue is full the entry is dropped and counted
+    rather than blocking the caller. close() (also run at interpreter
+    exit) writes everything still queued.
+    """
+    
+    COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+    
+    def __init__(
+        self,
+        log_dir: str = "conversation_logs",
+        compression: Optional[str] = None,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0
+    ):
+        """
+        Start the writer thread.
+        
+        Args:
+            log_dir: Directory to store logs
+            compression: None, "gzip" or "zstd" (needs the zstandard package)
+            max_queue: Entries held in memory before new ones are dropped
+            batch_size: Maximum entries written per batch
+            flush_interval: Seconds between flushes of the open file
+        """
+        if compression not in self.COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown log compression: {compression}")
+        if compression == "zstd":
+            import zstandard  # noqa: F401  Fail at startup, not in the writer thread
+        
+        self.log_dir = log_dir
+        self.compression = compression
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._raw_file = None
+        self._file_day = None
+        self._stopped = threading.Event()
+        
+        # submit() runs on every request thread; counters change under the lock
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.write_errors = 0
+        
+        os.makedirs(log_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="conversation-log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """
+        Queue an entry for writing without blocking.
+        
+        Args:
+            entry: JSON-serializable log entry with an ISO "timestamp"
+            
+        Returns:
+            False if the queue was full or the sink is closed and the entry was dropped
+        """
+        # Checked and queued under the lock so close() cannot slip its sentinel in between
+        with self._lock:
+            accepted = False
+            if not self._stopped.is_set():
+                try:
+                    self._queue.put_nowait(entry)
+                    accepted = True
+                except queue.Full:
+                    pass
+            if accepted:
+                self.submitted += 1
+            else:
+                self.dropped += 1
+        return accepted
+    
+    def _open(self, day: str) -> None:
+        """Open (append) the log file for a day, closing the previous one."""
+        self._close_file()
+        path = os.path.join(
+            self.log_dir, f"conversation_log_{day}.jsonl{self.COMPRESSION_SUFFIXES[self.compression]}"
+        )
+        self._raw_file = open(path, "ab")
+        if self.compression == "gzip":
+            # Each open appends a new gzip member; concatenated members are one valid stream
+            self._file = gzip.GzipFile(fileobj=self._raw_file, mode="ab")
+        elif self.compression == "zstd":
+            import zstandard
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw_file, closefd=False)
+        else:
+            self._file = self._raw_file
+        self._file_day = day
+    
+    def _close_file(self) -> None:
+        if self._file is not None and self._file is not self._raw_file:
+            self._file.close()
+        if self._raw_file is not None:
+            self._raw_file.close()
+        self._file = self._raw_file = self._file_day = None
+    
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Write entries grouped by day, rotating the file on date change."""
+        for entry in batch:
+            day = str(entry.get("timestamp", ""))[:10] or datetime.now().strftime("%Y-%m-%d")
+            if day != self._file_day:
+                self._open(day)
+            self._file.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._file.flush()
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+    
+    def _run(self) -> None:
+        while True:
+            try:
+                entry = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    break
+                continue
+            
+            batch = [] if entry is None else [entry]
+            done = entry is None
+            while not done and len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    done = True
+                else:
+                    batch.append(entry)
+            
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    with self._lock:
+                        self.write_errors += 1
+                    print(f"Conversation log write failed: {e}")
+                    self._close_file()
+            if done:
+                break
+        self._close_file()
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop accepting entries, write everything queued and close the file.
+        
+        Args:
+            timeout: Seconds to wait for the writer thread
+        """
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self._stopped.set()
+        # The sentinel queues behind every pending entry, so they are all written first
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get queue and write counters.
+        
+        Returns:
+            Dictionary with queued, submitted, written, dropped, batches and write_errors
+        """
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "write_errors": self.write_errors
+            }
+
+
+_log_sinks: Dict[str, ConversationLogSink] = {}
+_log_sinks_lock = threading.Lock()
+
+
+def get_conversation_log_sink(log_dir: str = "conversation_logs", compression: Optional[str] = None) -> ConversationLogSink:
+    """
+    Get the process-wide log sink for a directory, starting it on first use.
+    
+    Args:
+        log_dir: Directory to store logs
+        compression: None, "gzip" or "zstd"; only used when the sink is created
+        
+    Returns:
+        Shared ConversationLogSink instance
+    """
+    with _log_sinks_lock:
+        if log_dir not in _log_sinks:
+            _log_sinks[log_dir] = ConversationLogSink(log_dir, compression=compression)
+        return _log_sinks[log_dir]
+
+
 def log_conversation(
     user_query: str, 
     bot_response: str, 
     metadata: Optional[Dict[str, Any]] = None,
-    log_dir: str = "conversation_logs"
+    log_dir: str = "conversation_logs",
+    compression: Optional[str] = None
 ) -> None:
     """
     Log conversation to a file.
     
+    The entry is handed to the directory's background sink; the file write
+    happens off the request path.
+    
     Args:
         user_query: User's query text
         bot_response: Bot's response text
         metadata: Additional metadata about the conversation
         log_dir: Directory to store logs
+        compression: None, "gzip" or "zstd"
     """
-    # Create log directory if it doesn't exist
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
     # Create log entry
     log_entry = {
         "timestamp": datetime.now().isoformat(),
@@ -75,45 +305,168 @@ def log_conversation(
     if metadata:
         log_entry["metadata"] = metadata
     
-    # Write to daily log file
-    today = datetime.now().strftime("%Y-%m-%d")
-    log_file = os.path.join(log_dir, f"conversation_log_{today}.jsonl")
-    
-    with open(log_file, 'a') as f:
-        f.write(json.dumps(log_entry) + "\n")
+    get_conversation_log_sink(log_dir, compression).submit(log_entry)
 
 # Performance monitoring
+class LatencyHistogram:
+    """
+    Fixed-memory latency summary: count, total, min, max and log-spaced buckets.
+    
+    Bucket bounds grow by `growth` from `min_value` seconds, so a percentile
+    read from them is within that factor of the true value however many
+    samples were recorded.
+    """
+    
+    def __init__(self, min_value: float = 1e-4, max_value: float = 600.0, growth: float = 1.1):
+        self.bounds: List[float] = []
+        bound = min_value
+        while bound < max_value:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(bound)
+        # One extra bucket for values above the last bound
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+    
+    def add(self, value: float) -> None:
+        """Record one value in seconds."""
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+    
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile from the buckets.
+        
+        Args:
+            q: Percentile between 0 and 100
+            
+        Returns:
+            Upper bound of the bucket holding the percentile, clamped to min/max
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+
+class _Span:
+    """Timer for one operation; see PerformanceMonitor.span."""
+    
+    __slots__ = ("monitor", "operation", "start_time", "duration", "_token")
+    
+    def __init__(self, monitor: "PerformanceMonitor", operation: str):
+        self.monitor = monitor
+        self.operation = operation
+        self.start_time = None
+        self.duration = 0.0
+        self._token = None
+    
+    def __enter__(self) -> "_Span":
+        self.start_time = time.perf_counter()
+        stack = self.monitor._stack.get()
+        self._token = self.monitor._stack.set(stack + (self,))
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.duration = time.perf_counter() - self.start_time
+        self.monitor._stack.reset(self._token)
+        self.monitor.record(self.operation, self.duration)
+
+
 class PerformanceMonitor:
-    """Simple performance monitoring utility."""
+    """
+    Thread-safe performance monitoring utility.
+    
+    Operations are timed as spans on a monotonic clock. Open spans live on a
+    per-thread / per-asyncio-task stack, so nested operations (an
+    agent_response inside a query_processing) each get their own timer and
+    concurrent sessions sharing one monitor never stop each other's
+    timers. Durations go into fixed-size histograms, so memory stays
+    constant however many requests are served.
+    """
     
     def __init__(self):
-        self.start_time = None
-        self.metrics = {}
+        self.metrics: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._stack: contextvars.ContextVar = contextvars.ContextVar(
+            f"perf_spans_{id(self)}", default=()
+        )
+    
+    def span(self, operation: str) -> _Span:
+        """
+        Time an operation with a context manager.
+        
+        Args:
+            operation: Name of the operation
+            
+        Returns:
+            Span whose duration (seconds) is set when the block exits
+        """
+        return _Span(self, operation)
     
     def start(self, operation: str) -> None:
-        """Start timing an operation."""
-        self.start_time = time.time()
-        self.current_operation = operation
+        """Start timing an operation; nested calls are timed independently."""
+        self.span(operation).__enter__()
     
     def stop(self) -> float:
         """
-        Stop timing the current operation.
+        Stop timing the innermost operation started in this thread or task.
         
         Returns:
             Duration in seconds
         """
-        if self.start_time is None:
+        stack = self._stack.get()
+        if not stack:
             return 0
-            
-        duration = time.time() - self.start_time
         
-        if self.current_operation not in self.metrics:
-            self.metrics[self.current_operation] = []
-            
-        self.metrics[self.current_operation].append(duration)
-        self.start_time = None
+        current = stack[-1]
+        current.duration = time.perf_counter() - current.start_time
+        self._stack.set(stack[:-1])
+        self.record(current.operation, current.duration)
         
-        return duration
+        return current.duration
+    
+    def record(self, operation: str, duration: float) -> None:
+        """
+        Record a duration measured elsewhere, e.g. across a streamed response.
+        
+        Args:
+            operation: Name of the operation
+            duration: Duration in seconds
+        """
+        with self._lock:
+            histogram = self.metrics.get(operation)
+            if histogram is None:
+                histogram = self.metrics[operation] = LatencyHistogram()
+            histogram.add(duration)
+        
+        for listener in self._listeners:
+            listener(operation, duration)
+    
+    def add_listener(self, listener: Callable[[str, float], None]) -> None:
+        """
+        Also send every recorded duration to a callback, e.g. a metrics exporter.
+        
+        Args:
+            listener: Called with (operation, duration) after each record
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                # Copy on write, so record() iterates without the lock
+                self._listeners = self._listeners + [listener]
     
     def get_stats(self) -> Dict[str, Dict[str, float]]:
         """
@@ -124,17 +477,21 @@ class PerformanceMonitor:
         """
         stats = {}
         
-        for op, durations in self.metrics.items():
-            if not durations:
-                continue
-                
-            stats[op] = {
-                "avg": sum(durations) / len(durations),
-                "min": min(durations),
-                "max": max(durations),
-                "count": len(durations),
-                "total": sum(durations)
-            }
+        with self._lock:
+            for op, histogram in self.metrics.items():
+                if not histogram.count:
+                    continue
+                    
+                stats[op] = {
+                    "avg": histogram.total / histogram.count,
+                    "min": histogram.min,
+                    "max": histogram.max,
+                    "count": histogram.count,
+                    "total": histogram.total,
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95),
+                    "p99": histogram.percentile(99)
+                }
             
         return stats
 
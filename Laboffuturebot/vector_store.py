@@ -0,0 +1,407 @@
+"""
+In-process vector store for the Lab o Future knowledge base.
+Keeps chunk embeddings in a memory-mapped float32 matrix and answers
+top-k cosine queries with a brute-force matrix product.
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agno.document import Document
+from agno.embedder.openai import OpenAIEmbedder
+from agno.vectordb.base import VectorDb
+
+from ingest import hash_chunk
+
+
+class IndexSnapshot(NamedTuple):
+    """Document ids and the matching matrix rows, swapped in as one object."""
+    ids: List[str]
+    matrix: Optional[np.ndarray]
+
+
+class MmapVectorIndex:
+    """
+    Read-mostly matrix of L2-normalized float32 embeddings on disk.
+
+    The matrix file is opened with np.memmap in read-only mode, so every
+    worker process that opens the same path shares the OS page cache
+    instead of holding its own copy.
+
+    Ids and matrix live in one IndexSnapshot that reload() replaces with a
+    single assignment, so a search running on another thread never pairs
+    new ids with an old matrix.
+    """
+
+    IDS_FILE = "ids.json"
+
+    def __init__(self, path: str, dimensions: int):
+        """
+        Open (or prepare) an index directory.
+
+        Args:
+            path: Directory holding the matrix and id files
+            dimensions: Embedding dimensions
+        """
+        self.path = Path(path)
+        self.dimensions = dimensions
+        self.snapshot = IndexSnapshot([], None)
+        self._version: Optional[int] = None
+        self.reload()
+
+    def _current_version(self) -> Optional[int]:
+        try:
+            return os.stat(self.path / self.IDS_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-open the files if another process rewrote them.
+
+        The ids file is replaced last on every write, so its mtime acts as
+        the index version. Costs one stat() call.
+
+        Returns:
+            True if the index was reloaded
+        """
+        if self._current_version() == self._version:
+            return False
+        self.reload()
+        return True
+
+    def reload(self) -> None:
+        """Re-open the matrix and id files."""
+        version = self._current_version()
+        if version is None:
+            self.snapshot, self._version = IndexSnapshot([], None), None
+            return
+
+        with open(self.path / self.IDS_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        ids = manifest["ids"]
+        matrix = (
+            np.memmap(self.path / manifest["matrix"], dtype=np.float32, mode="r",
+                      shape=(len(ids), self.dimensions))
+            if ids else None
+        )
+        self.snapshot, self._version = IndexSnapshot(ids, matrix), version
+
+    @property
+    def ids(self) -> List[str]:
+        return self.snapshot.ids
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self.snapshot.matrix
+
+    def __len__(self) -> int:
+        return len(self.snapshot.ids)
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so a dot product is cosine similarity."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def write(self, ids: List[str], vectors: Sequence, block_size: int = 65536) -> None:
+        """
+        Replace the index contents atomically.
+
+        Each write goes to a new matrix file and the ids file is swapped
+        last to point at it, so readers holding the old mapping keep a
+        consistent view (and Windows never has to replace a mapped file).
+
+        Args:
+            ids: Document ids, one per row
+            vectors: Embedding matrix of shape (len(ids), dimensions), or a
+                list of row vectors; only block_size rows are stacked at a time
+            block_size: Rows normalized and written per step
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        matrix_name = f"embeddings-{time.time_ns()}.f32"
+
+        if ids:
+            out = np.memmap(self.path / matrix_name, dtype=np.float32, mode="w+", shape=(len(ids), self.dimensions))
+            for start in range(0, len(ids), block_size):
+                out[start:start + block_size] = self.normalize(vectors[start:start + block_size])
+            out.flush()
+            del out
+
+        ids_tmp = self.path / (self.IDS_FILE + ".tmp")
+        with open(ids_tmp, "w", encoding="utf-8") as f:
+            json.dump({"matrix": matrix_name, "ids": ids}, f)
+        os.replace(ids_tmp, self.path / self.IDS_FILE)
+
+        self.reload()
+        self._remove_stale_matrices(keep=matrix_name)
+
+    def _remove_stale_matrices(self, keep: str) -> None:
+        """Delete old matrix files; ones still mapped elsewhere are left for next time."""
+        for old in self.path.glob("embeddings-*.f32"):
+            if old.name != keep:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+
+    def search(self, query: np.ndarray, top_k: int = 5, block_size: int = 262144) -> List[Tuple[str, float]]:
+        """
+        Brute-force top-k by cosine similarity.
+
+        Args:
+            query: Query embedding
+            top_k: Number of results
+            block_size: Rows scored per step, bounding temporary memory
+
+        Returns:
+            List of (document id, score) sorted by descending score
+        """
+        ids, matrix = self.snapshot
+        if matrix is None or top_k <= 0:
+            return []
+
+        query = self.normalize(query)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        for start in range(0, len(ids), block_size):
+            scores = matrix[start:start + block_size] @ query
+            k = min(top_k, len(scores))
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            best_rows = np.concatenate([best_rows, candidates + start])
+            best_scores = np.concatenate([best_scores, scores[candidates]])
+            if len(best_rows) > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1)[:top_k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores)
+        return [(ids[best_rows[i]], float(best_scores[i])) for i in order]
+
+
+class LocalVectorDb(VectorDb):
+    """
+    agno VectorDb backed by an MmapVectorIndex plus a JSON document file.
+
+    Drop-in replacement for PgVector inside CSVKnowledgeBase for a corpus
+    that fits on one machine; no database round trip per query.
+
+    Every write rewrites the files, so bulk changes go inside batch(), which
+    writes once at the end; IncrementalIngestor.sync runs in one batch.
+    """
+
+    DOCUMENTS_FILE = "documents.json"
+
+    def __init__(self, path: str = "vector_index", embedder=None):
+        """
+        Initialize the local vector store.
+
+        Args:
+            path: Directory for the index files
+            embedder: agno embedder (defaults to OpenAIEmbedder)
+        """
+        self.path = Path(path)
+        self.embedder = embedder or OpenAIEmbedder()
+        self.dimensions = getattr(self.embedder, "dimensions", None) or 1536
+        self.index = MmapVectorIndex(str(self.path), self.dimensions)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        # Documents with embeddings while a batch() is open, else None
+        self._pending: Optional[Dict[str, Dict[str, Any]]] = None
+        self._pending_changed = False
+        self._load_documents()
+
+    def _load_documents(self) -> None:
+        documents_path = self.path / self.DOCUMENTS_FILE
+        if documents_path.exists():
+            with open(documents_path, encoding="utf-8") as f:
+                self.documents = json.load(f)
+        else:
+            self.documents = {}
+
+    def _save(self, documents: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Rewrite the document file and matrix for the given documents.
+
+        The document file is replaced before the index, so a reader that
+        picks up the new index always finds its documents.
+        """
+        stored = {
+            doc_id: {key: value for key, value in doc.items() if key != "embedding"}
+            for doc_id, doc in documents.items()
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / (self.DOCUMENTS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+        os.replace(tmp, self.path / self.DOCUMENTS_FILE)
+        self.documents = stored
+
+        ids = list(documents)
+        self.index.write(ids, [documents[doc_id]["embedding"] for doc_id in ids])
+
+    def _all_with_embeddings(self) -> Dict[str, Dict[str, Any]]:
+        """Current documents with their stored embeddings (memmap rows, not copies) attached."""
+        ids, matrix = self.index.snapshot
+        vectors = {} if matrix is None else dict(zip(ids, matrix))
+        return {
+            doc_id: dict(doc, embedding=vectors[doc_id])
+            for doc_id, doc in self.documents.items() if doc_id in vectors
+        }
+
+    def _editable(self) -> Dict[str, Dict[str, Any]]:
+        """Documents to modify: the open batch, or a fresh copy of the stored ones."""
+        return self._pending if self._pending is not None else self._all_with_embeddings()
+
+    def _commit(self, documents: Dict[str, Dict[str, Any]]) -> None:
+        """Write modified documents now, or leave them for the end of the open batch."""
+        if self._pending is None:
+            self._save(documents)
+        else:
+            self._pending_changed = True
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect upserts, deletes and metadata updates and write the files once.
+
+        Whatever was applied is written on exit, also when the block raises,
+        so finished batches are not embedded again; nothing is written if
+        nothing changed. Nested calls join the outer batch.
+        """
+        if self._pending is not None:
+            yield
+            return
+        self._pending, self._pending_changed = self._all_with_embeddings(), False
+        try:
+            yield
+        finally:
+            documents, self._pending = self._pending, None
+            if self._pending_changed:
+                self._save(documents)
+
+    # -- Methods used by IncrementalIngestor --------------------------------
+
+    def existing_meta(self) -> Dict[str, Dict[str, Any]]:
+        """Return meta_data for every stored document id."""
+        return {doc_id: doc.get("meta_data") or {} for doc_id, doc in self.documents.items()}
+
+    def delete_ids(self, ids: Iterable[str]) -> None:
+        """Delete documents by id."""
+        documents = self._editable()
+        for doc_id in ids:
+            documents.pop(doc_id, None)
+        self._commit(documents)
+
+    def update_meta(self, meta_by_id: Dict[str, Dict[str, Any]]) -> None:
+        """Replace meta_data (and name from the first URL) without re-embedding."""
+        documents = self._editable()
+        for doc_id, meta in meta_by_id.items():
+            if doc_id in documents:
+                documents[doc_id]["meta_data"] = meta
+                urls = meta.get("urls") or []
+                documents[doc_id]["name"] = urls[0] if urls else None
+        self._commit(documents)
+
+    def search_by_vector(self, embedding: List[float], top_k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k (document id, cosine score) for an embedding."""
+        if self.index.reload_if_changed():
+            self._load_documents()
+        return self.index.search(np.asarray(embedding, dtype=np.float32), top_k)
+
+    # -- agno VectorDb interface ---------------------------------------------
+
+    def create(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    async def async_create(self) -> None:
+        self.create()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    async def async_exists(self) -> bool:
+        return self.exists()
+
+    def doc_exists(self, document: Document) -> bool:
+        return document.id in self.documents if document.id else any(
+            doc["content"] == document.content for doc in self.documents.values()
+        )
+
+    async def async_doc_exists(self, document: Document) -> bool:
+        return self.doc_exists(document)
+
+    def name_exists(self, name: str) -> bool:
+        return any(doc.get("name") == name for doc in self.documents.values())
+
+    async def async_name_exists(self, name: str) -> bool:
+        return self.name_exists(name)
+
+    def id_exists(self, id: str) -> bool:
+        return id in self.documents
+
+    def upsert_available(self) -> bool:
+        return True
+
+    def upsert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        stored = self._editable()
+        for document in documents:
+            document.embed(embedder=self.embedder)
+            # Same content hash as ingest, so ids are stable across processes
+            doc_id = document.id or hash_chunk(document.content)
+            stored[doc_id] = {
+                "name": document.name,
+                "content": document.content,
+                "meta_data": document.meta_data,
+                "embedding": document.embedding,
+            }
+        self._commit(stored)
+
+    async def async_upsert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await asyncio.to_thread(self.upsert, documents, filters)
+
+    def insert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self.upsert([doc for doc in documents if not self.doc_exists(doc)], filters)
+
+    async def async_insert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await asyncio.to_thread(self.insert, documents, filters)
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        embedding = self.embedder.get_embedding(query)
+        results = []
+        for doc_id, score in self.search_by_vector(embedding, limit):
+            doc = self.documents.get(doc_id)
+            if doc is None:
+                continue
+            results.append(Document(
+                id=doc_id,
+                name=doc.get("name"),
+                content=doc["content"],
+                meta_data=dict(doc.get("meta_data") or {}, score=score),
+                embedder=self.embedder,
+            ))
+        return results
+
+    async def async_search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return await asyncio.to_thread(self.search, query, limit, filters)
+
+    def drop(self) -> None:
+        documents = self._editable()
+        documents.clear()
+        self._commit(documents)
+
+    async def async_drop(self) -> None:
+        self.drop()
+
+    def optimize(self) -> None:
+        pass
+
+    def delete(self) -> bool:
+        self.drop()
+        return True
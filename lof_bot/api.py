@@ -0,0 +1,285 @@
+"""
+HTTP API for the Lab of Future assistant.
+
+All clients share the one warm knowledge base, agent setup and FAQ cache
+that main.py builds at import time. Requests run under a bounded
+concurrency limit; excess requests wait in a bounded queue and are shed
+with 429 (queue full) or 503 (waited too long). The database pools are
+sized from the same LOF_API_MAX_CONCURRENCY (see faq_cache/engines.py) and
+startup fails if they are configured smaller.
+
+Run from the lof_bot directory:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+GET /metrics serves Prometheus metrics (see metrics.py) when
+prometheus_client is installed.
+
+Set LOF_API_STANDIN_LATENCY (seconds) to serve a local stand-in model
+instead of main.py, e.g. for load testing without a database or API key.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+
+import metrics
+from faq_cache.engines import check_pool_capacity, pool_stats
+
+MAX_CONCURRENCY = int(os.getenv("LOF_API_MAX_CONCURRENCY", "32"))
+MAX_QUEUE = int(os.getenv("LOF_API_MAX_QUEUE", "256"))
+QUEUE_TIMEOUT = float(os.getenv("LOF_API_QUEUE_TIMEOUT", "10"))
+STANDIN_LATENCY = os.getenv("LOF_API_STANDIN_LATENCY")
+
+
+class StandInPipeline:
+    """Local stand-in for main.py that sleeps like a model call"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def aprocess_user_query(self, user_query: str) -> str:
+        await asyncio.sleep(self.latency)
+        return f"Stand-in answer about Lab of Future for: {user_query}"
+
+    def process_user_query_stream(self, user_query: str) -> Iterator[str]:
+        words = f"Stand-in answer about Lab of Future for: {user_query}".split()
+        for word in words:
+            time.sleep(self.latency / len(words))
+            yield word + " "
+
+    async def drain_background_tasks(self):
+        pass
+
+
+def _load_pipeline():
+    if STANDIN_LATENCY is not None:
+        return StandInPipeline(float(STANDIN_LATENCY))
+    import main
+    return main
+
+
+class AdmissionControl:
+    """
+    Bounded concurrency with a bounded wait queue and load shedding.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.total_queue_wait = 0.0
+
+    async def acquire(self):
+        """
+        Wait for a slot; raise 429 if the queue is full or 503 if the wait times out.
+        """
+        if not self._slots.locked():
+            # A slot is free: take it without waiting, so it never counts as queued
+            await self._slots.acquire()
+            self.in_flight += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise HTTPException(status_code=429, detail="Too many requests queued, retry later")
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise HTTPException(status_code=503, detail="Server busy, retry later")
+        finally:
+            self.queued -= 1
+            self.total_queue_wait += time.perf_counter() - start
+        self.in_flight += 1
+
+    def release(self, ok: bool = True):
+        self.in_flight -= 1
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        admitted = self.completed + self.failed + self.in_flight
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_queue_wait": self.total_queue_wait / admitted if admitted else 0.0,
+        }
+
+
+_STREAM_END = object()
+
+
+async def _iterate_in_thread(pieces: Iterator[str]) -> AsyncIterator[str]:
+    """
+    Pull a blocking iterator in one worker thread and hand its items to the loop.
+
+    One thread per stream rather than a thread-pool hop per piece; the
+    thread stops and closes the iterator once the consumer goes away.
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def post(item, error=None):
+        if not stop.is_set():
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (item, error))
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def drain():
+        error = None
+        try:
+            for piece in pieces:
+                if stop.is_set():
+                    break
+                post(piece)
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(pieces, "close", None)
+            if close is not None:
+                close()
+        post(_STREAM_END, error)
+
+    threading.Thread(target=drain, name="chat-stream", daemon=True).start()
+    try:
+        while True:
+            piece, error = await items.get()
+            if error is not None:
+                raise error
+            if piece is _STREAM_END:
+                break
+            yield piece
+    finally:
+        stop.set()
+
+
+class ChatRequest(BaseModel):
+    message: str
+
+
+class ChatResponse(BaseModel):
+    response: str
+    latency: float
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.pipeline = _load_pipeline()
+    if STANDIN_LATENCY is None:
+        check_pool_capacity(MAX_CONCURRENCY)
+    app.state.admission = AdmissionControl(MAX_CONCURRENCY, MAX_QUEUE, QUEUE_TIMEOUT)
+    metrics.watch(admission=app.state.admission)
+    app.state.started_at = time.time()
+    yield
+    await app.state.pipeline.drain_background_tasks()
+
+
+app = FastAPI(title="Lab of Future Assistant API", lifespan=lifespan)
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    admission = app.state.admission
+    await admission.acquire()
+    start = time.perf_counter()
+    ok = False
+    try:
+        response = await app.state.pipeline.aprocess_user_query(request.message)
+        ok = True
+    finally:
+        admission.release(ok)
+    return ChatResponse(response=response, latency=time.perf_counter() - start)
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    admission = app.state.admission
+    # Admit before responding so 429/503 can still be the status code
+    await admission.acquire()
+    released = False
+
+    def release(ok: bool):
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(ok)
+
+    try:
+        pieces = app.state.pipeline.process_user_query_stream(request.message)
+
+        async def body() -> AsyncIterator[str]:
+            ok = False
+            try:
+                # The pipeline generator blocks on the model, so pull it off the event loop
+                async for piece in _iterate_in_thread(pieces):
+                    yield piece
+                ok = True
+            finally:
+                release(ok)
+
+        # A body that never runs (client gone before streaming starts, response
+        # dropped) gets its slot back from the background task or, failing
+        # that, when it is collected; both are no-ops once the body released
+        stream = body()
+        weakref.finalize(stream, release, False)
+        return StreamingResponse(
+            stream, media_type="text/plain; charset=utf-8", background=BackgroundTask(release, False)
+        )
+    except BaseException:
+        release(False)
+        raise
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "uptime": time.time() - app.state.started_at,
+        "standin": STANDIN_LATENCY is not None,
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return dict(app.state.admission.stats(), db_pools=pool_stats())
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    rendered = metrics.render()
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Metrics disabled (install prometheus_client)")
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,411 @@
+"""
+End-to-end benchmark of process_user_query, fully offline.
+
+main.py is imported against a scratch SQLite database (LOF_DB_URL) with the
+local hashing embedder (LOF_EMBEDDING_BACKEND=hashing) and without syncing
+the pgvector knowledge base (LOF_LOAD_KNOWLEDGE=0). create_agent is replaced
+by StandInAgent, which embeds the question through the embedding service,
+searches an in-memory NumPy index of laboffuture_chunks.csv and answers
+from the best chunks after --llm-latency seconds. The FAQ cache tiers,
+SQLite upserts, write-behind stats, scope classifier and post-processing
+are the production code.
+
+The query corpus is cut from the chunk CSV (seeded): fresh questions,
+repeats with other case and spacing (FAQ cache hits) and off-topic
+questions (scope fallbacks).
+
+Stages are the metrics.py stage names, recorded by swapping in a
+recorder for metrics.stage/observe/count. Each --concurrency level starts
+from empty FAQ and embedding caches and reports throughput, p50/p95/p99
+per stage, outcomes and cache hit rates. A separate sequential pass over
+--alloc-queries queries runs under tracemalloc and reports, per stage,
+net allocated blocks, net bytes and peak bytes (nested stages included
+in their parent). Results are saved as JSON; --compare prints the change
+against an earlier file and --fail-over exits non-zero when any total p95
+regressed by more than that many percent.
+
+    python bench_e2e.py --queries 500 --concurrency 1 4 --out bench_e2e.json
+    python bench_e2e.py --compare bench_e2e.json --fail-over 20
+"""
+import argparse
+import csv
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+
+OFF_TOPIC_QUERIES = [
+    "What's the weather like in Dubai today?",
+    "Latest news about the elections",
+    "Which stock should I buy this week?",
+    "Give me medical advice for a headache",
+    "Recommend a good movie for tonight",
+    "Who won the football match yesterday?",
+]
+
+QUESTION_TEMPLATES = [
+    "What is {}?",
+    "Tell me about {}",
+    "How does {} work?",
+    "Can you explain {}",
+    "{}",
+]
+
+
+class ChunkIndex:
+    """In-memory stand-in for the pgvector documents table."""
+
+    def __init__(self, chunks: List[str], embedding_service):
+        self.chunks = chunks
+        self.embedding_service = embedding_service
+        self.matrix = np.asarray(embedding_service.backend.embed_batch(chunks), dtype=np.float32)
+        self.matrix /= np.maximum(np.linalg.norm(self.matrix, axis=1, keepdims=True), 1e-12)
+
+    def search(self, query: str, top_k: int = 5) -> List[str]:
+        with metrics.stage("query_embedding"):
+            vector = np.asarray(self.embedding_service.embed(query), dtype=np.float32)
+        with metrics.stage("vector_search"):
+            scores = self.matrix @ vector
+            best = np.argpartition(-scores, top_k)[:top_k]
+            return [self.chunks[i] for i in best[np.argsort(-scores[best])]]
+
+
+class StandInAgent:
+    """Agent stand-in: retrieves from the ChunkIndex, sleeps like a model call, answers from context."""
+
+    def __init__(self, index: ChunkIndex, latency: float, search_knowledge: bool = True):
+        self.index = index
+        self.latency = latency
+        self.search_knowledge = search_knowledge
+        self.model = SimpleNamespace(id="stand-in")
+
+    def _answer(self, message: str) -> str:
+        context = ""
+        if self.search_knowledge:
+            with metrics.stage("knowledge_search"):
+                context = " ".join(self.index.search(message))
+        time.sleep(self.latency)
+        return f"About {message.strip()}: " + " ".join(context.split()[:60])
+
+    def run(self, message: str, stream: bool = False):
+        text = self._answer(message)
+        if stream:
+            return (SimpleNamespace(content=word + " ") for word in text.split())
+        return SimpleNamespace(content=text, run_id=None, metrics={})
+
+
+class StageRecorder:
+    """
+    Replacement for metrics.stage/observe/count keeping every duration,
+    with optional per-stage allocation tracking.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Counter = Counter()
+        self.allocations: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        self.trace_allocations = False
+        self._alloc_stack: List[Dict[str, int]] = []
+
+    def install(self) -> None:
+        metrics.stage = self.stage
+        metrics.observe = self.observe
+        metrics.count = self.count
+
+    def reset(self) -> None:
+        with self._lock:
+            self.durations = defaultdict(list)
+            self.outcomes = Counter()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[name].append(seconds)
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        frame = self._enter_allocations() if self.trace_allocations else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            if frame is not None:
+                self._exit_allocations(name, frame)
+
+    def _enter_allocations(self) -> Dict[str, int]:
+        current, peak = tracemalloc.get_traced_memory()
+        if self._alloc_stack:
+            # Keep the parent's peak before resetting it for this stage
+            self._alloc_stack[-1]["peak"] = max(self._alloc_stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame = {"bytes": current, "peak": current, "blocks": sys.getallocatedblocks()}
+        self._alloc_stack.append(frame)
+        return frame
+
+    def _exit_allocations(self, name: str, frame: Dict[str, int]) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        self._alloc_stack.pop()
+        frame_peak = max(frame["peak"], peak)
+        if self._alloc_stack:
+            self._alloc_stack[-1]["peak"] = max(self._alloc_stack[-1]["peak"], frame_peak)
+        totals = self.allocations[name]
+        totals[0] += 1
+        totals[1] += sys.getallocatedblocks() - frame["blocks"]
+        totals[2] += current - frame["bytes"]
+        totals[3] = max(totals[3], frame_peak - frame["bytes"])
+
+    @contextmanager
+    def tracing_allocations(self):
+        tracemalloc.start()
+        self.trace_allocations = True
+        try:
+            yield
+        finally:
+            self.trace_allocations = False
+            tracemalloc.stop()
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Count, mean and nearest-rank percentiles in milliseconds."""
+    ordered = sorted(durations)
+    if not ordered:
+        return {"count": 0}
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def load_chunks(csv_path: str) -> List[str]:
+    csv.field_size_limit(10 ** 8)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        chunks = [(row.get("chunk") or "").strip() for row in csv.DictReader(f)]
+    return [chunk for chunk in dict.fromkeys(chunks) if chunk]
+
+
+def build_corpus(chunks: List[str], count: int, seed: int, repeat_ratio: float, off_topic_ratio: float) -> List[str]:
+    """Seeded questions from chunk word windows, with repeats and off-topic queries mixed in."""
+    chunks = [chunk for chunk in chunks if len(chunk.split()) > 12]
+    rng = random.Random(seed)
+    fresh: List[str] = []
+    queries = []
+    for _ in range(count):
+        draw = rng.random()
+        if fresh and draw < repeat_ratio:
+            query = rng.choice(fresh)
+            query = rng.choice([query.lower(), query.upper(), f"  {query} ", query])
+        elif draw < repeat_ratio + off_topic_ratio:
+            query = rng.choice(OFF_TOPIC_QUERIES)
+        else:
+            words = rng.choice(chunks).split()
+            start = rng.randrange(0, len(words) - 8)
+            query = rng.choice(QUESTION_TEMPLATES).format(" ".join(words[start:start + rng.randint(3, 8)]))
+            fresh.append(query)
+        queries.append(query)
+    return queries
+
+
+def load_pipeline(args, workdir: str):
+    """Import main.py against SQLite and the hashing embedder, with StandInAgents."""
+    os.environ["LOF_DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ["LOF_CHUNKS_CSV"] = args.csv
+    os.environ["LOF_LOAD_KNOWLEDGE"] = "0"
+    os.environ["LOF_EMBEDDING_BACKEND"] = "hashing"
+    os.environ.pop("LOF_EMBEDDING_CACHE", None)
+    pipeline = importlib.import_module("main")
+
+    index = ChunkIndex(load_chunks(args.csv), pipeline.get_embedding_service())
+    pipeline.create_agent = lambda search_knowledge=True: StandInAgent(index, args.llm_latency, search_knowledge)
+    return pipeline
+
+
+def reset_caches(pipeline) -> None:
+    """Empty the FAQ cache (both tiers) and the query embedding cache."""
+    faq_cache = pipeline.faq_cache
+    pipeline.get_embedding_service().memory_cache.clear()
+    faq_cache.flush_stats()
+    faq_cache.local_cache.clear()
+    with faq_cache.engine.begin() as conn:
+        conn.execute(faq_cache.table.delete())
+
+
+def run_level(pipeline, recorder: StageRecorder, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    reset_caches(pipeline)
+    recorder.reset()
+    local_before = pipeline.faq_cache.get_stats()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(pipeline.process_user_query, queries))
+    elapsed = time.perf_counter() - start
+
+    local_after = pipeline.faq_cache.get_stats()
+    local_hits = local_after["hits"] - local_before["hits"]
+    local_lookups = local_hits + local_after["misses"] - local_before["misses"]
+    outcomes = dict(recorder.outcomes)
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "seconds": elapsed,
+        "throughput_qps": len(queries) / elapsed,
+        "outcomes": outcomes,
+        "cache_hit_rate": outcomes.get("cache_hit", 0) / len(queries),
+        "fallback_rate": (outcomes.get("out_of_scope", 0) + outcomes.get("fallback", 0)) / len(queries),
+        "local_tier_hit_rate": local_hits / local_lookups if local_lookups else 0.0,
+        "stages": {stage: summarize(values) for stage, values in sorted(recorder.durations.items())},
+    }
+
+
+def run_allocations(pipeline, recorder: StageRecorder, queries: List[str]) -> Dict[str, Dict[str, float]]:
+    reset_caches(pipeline)
+    with recorder.tracing_allocations():
+        for query in queries:
+            pipeline.process_user_query(query)
+    return {
+        stage: {
+            "calls": calls,
+            "net_blocks_per_call": blocks / calls,
+            "net_bytes_per_call": nbytes / calls,
+            "peak_bytes": peak,
+        }
+        for stage, (calls, blocks, nbytes, peak) in sorted(recorder.allocations.items())
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    for run in results["runs"]:
+        print(f"\nconcurrency {run['concurrency']}: {run['throughput_qps']:.1f} queries/s, "
+              f"cache hit rate {run['cache_hit_rate']:.1%} (local tier {run['local_tier_hit_rate']:.1%}), "
+              f"fallback rate {run['fallback_rate']:.1%}, outcomes {run['outcomes']}")
+        print(f"  {'stage':<22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, stats in run["stages"].items():
+            print(f"  {stage:<22} {stats['count']:>6} {stats['p50_ms']:>9.3f} "
+                  f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+    if results["allocations"]:
+        print(f"\nallocations over {results['args']['alloc_queries']} queries (tracemalloc, nested stages included)")
+        print(f"  {'stage':<22} {'blocks/call':>12} {'bytes/call':>12} {'peak bytes':>12}")
+        for stage, stats in results["allocations"].items():
+            print(f"  {stage:<22} {stats['net_blocks_per_call']:>12.1f} "
+                  f"{stats['net_bytes_per_call']:>12.0f} {stats['peak_bytes']:>12}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], total_stage: str) -> float:
+    """Print changes against a baseline run; returns the worst p95 regression of total_stage in percent."""
+    print(f"\nagainst {baseline.get('commit') or 'baseline'}:")
+    worst = 0.0
+    previous = {run["concurrency"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        old = previous.get(run["concurrency"])
+        if old is None:
+            continue
+        print(f"  concurrency {run['concurrency']}: throughput {old['throughput_qps']:.1f} -> "
+              f"{run['throughput_qps']:.1f} queries/s ({run['throughput_qps'] / old['throughput_qps'] - 1:+.1%})")
+        for stage, stats in run["stages"].items():
+            old_stats = old["stages"].get(stage)
+            if not old_stats or not old_stats.get("p95_ms"):
+                continue
+            change = stats["p95_ms"] / old_stats["p95_ms"] - 1
+            print(f"    {stage:<22} p95 {old_stats['p95_ms']:>9.3f} -> {stats['p95_ms']:>9.3f} ms ({change:+.1%})")
+            if stage == total_stage:
+                worst = max(worst, change * 100)
+    return worst
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of process_user_query")
+    parser.add_argument("--csv", default="../laboffuture_chunks.csv")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per stand-in model call")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3)
+    parser.add_argument("--off-topic-ratio", type=float, default=0.1)
+    parser.add_argument("--alloc-queries", type=int, default=100, help="0 skips the tracemalloc pass")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="bench_e2e.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--fail-over", type=float, help="Exit 1 if total p95 regressed by more than this %%")
+    args = parser.parse_args(argv)
+
+    args.csv = os.path.abspath(args.csv)
+    queries = build_corpus(load_chunks(args.csv), args.queries, args.seed, args.repeat_ratio, args.off_topic_ratio)
+    recorder = StageRecorder()
+    recorder.install()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        pipeline = load_pipeline(args, workdir)
+        print(f"Offline pipeline ready in {time.perf_counter() - start:.1f}s")
+
+        pipeline.process_user_query("warm up")
+        runs = [run_level(pipeline, recorder, queries, level) for level in args.concurrency]
+        allocations = run_allocations(pipeline, recorder, queries[:args.alloc_queries]) if args.alloc_queries else {}
+
+        pipeline.faq_cache.close()
+        pipeline.get_engine(pipeline.db_url).dispose()
+
+    results = {
+        "benchmark": "lof_bot.process_user_query",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "runs": runs,
+        "allocations": allocations,
+    }
+    print_report(results)
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            worst = compare(results, json.load(f), "total")
+        if args.fail_over is not None and worst > args.fail_over:
+            print(f"total p95 regressed by {worst:.1f}% (limit {args.fail_over}%)")
+            status = 1
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {args.out}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Embedding backend benchmark over laboffuture_chunks.csv.
+
+Builds a question set from the chunk corpus (a word window cut from a
+chunk; the relevant documents are every chunk containing that window),
+embeds the deduplicated corpus with each backend and reports single-query
+latency, batch throughput and recall@1/@5 by cosine similarity.
+
+    python bench_embedding.py --csv ../laboffuture_chunks.csv --queries 300
+    python bench_embedding.py --backends tfidf hashing sentence-transformers openai
+"""
+import argparse
+import csv
+import random
+import statistics
+import time
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from faq_cache.embedding import EmbeddingBackend, TfidfHashingBackend, create_backend
+
+
+def load_chunks(csv_path: str) -> List[str]:
+    csv.field_size_limit(10 ** 8)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        chunks = [(row.get("chunk") or "").strip() for row in csv.DictReader(f)]
+    return list(dict.fromkeys(chunk for chunk in chunks if chunk))
+
+
+def build_questions(chunks: Sequence[str], count: int, window: int, seed: int) -> List[Tuple[str, Set[int]]]:
+    rng = random.Random(seed)
+    questions = []
+    while len(questions) < count:
+        words = rng.choice(chunks).split()
+        if len(words) < window * 2:
+            continue
+        start = rng.randrange(0, len(words) - window)
+        question = " ".join(words[start:start + window])
+        relevant = {i for i, chunk in enumerate(chunks) if question in chunk}
+        questions.append((question, relevant))
+    return questions
+
+
+def embed_all(backend: EmbeddingBackend, texts: Sequence[str], batch_size: int = 128) -> np.ndarray:
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(backend.embed_batch(texts[start:start + batch_size]))
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def evaluate(backend: EmbeddingBackend, chunks: Sequence[str], questions) -> Dict[str, float]:
+    start = time.perf_counter()
+    corpus = embed_all(backend, chunks)
+    corpus_time = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for question, _ in questions:
+        start = time.perf_counter()
+        query_vectors.append(backend.embed_batch([question])[0])
+        latencies.append(time.perf_counter() - start)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries /= np.where(norms == 0, 1.0, norms)
+
+    top = np.argsort(-(queries @ corpus.T), axis=1)[:, :5]
+    hits_at_1 = sum(1 for row, (_, relevant) in zip(top, questions) if row[0] in relevant)
+    hits_at_5 = sum(1 for row, (_, relevant) in zip(top, questions) if relevant.intersection(row.tolist()))
+
+    latencies.sort()
+    return {
+        "corpus_docs_per_s": len(chunks) / corpus_time,
+        "query_p50_ms": statistics.median(latencies) * 1000,
+        "query_p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "recall_at_1": hits_at_1 / len(questions),
+        "recall_at_5": hits_at_5 / len(questions),
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Compare embedding backends on the chunk corpus")
+    parser.add_argument("--csv", default="../laboffuture_chunks.csv")
+    parser.add_argument("--backends", nargs="+", default=["tfidf", "hashing"])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--window", type=int, default=8, help="Words per generated question")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save-idf", help="Write the fitted TF-IDF weights to this .npy path")
+    args = parser.parse_args(argv)
+
+    chunks = load_chunks(args.csv)
+    questions = build_questions(chunks, args.queries, args.window, args.seed)
+    print(f"{len(chunks)} unique chunks, {len(questions)} questions\n")
+    print(f"{'backend':<24} {'docs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'R@1':>6} {'R@5':>6}")
+
+    for name in args.backends:
+        try:
+            if name == "tfidf":
+                backend = TfidfHashingBackend.fit(chunks, args.dimensions)
+                if args.save_idf:
+                    backend.save(args.save_idf)
+            else:
+                backend = create_backend(name, args.dimensions)
+        except Exception as e:
+            print(f"{name:<24} skipped: {e}")
+            continue
+
+        result = evaluate(backend, chunks, questions)
+        print(
+            f"{name:<24} {result['corpus_docs_per_s']:>9.0f} {result['query_p50_ms']:>8.2f} "
+            f"{result['query_p95_ms']:>8.2f} {result['recall_at_1']:>6.2f} {result['recall_at_5']:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Scope classifier benchmark and regression check.
+
+Compares FallbackHandler's precompiled TermMatcher against the original
+linear `in` scans (kept here as the reference) on a corpus of hand-written
+in/out-of-scope queries plus word windows cut from laboffuture_chunks.csv.
+Verdicts of is_educational_query, get_fallback_response and
+_contains_external_info must be identical; any mismatch is printed and the
+script exits non-zero.
+
+    python bench_scope.py --csv ../laboffuture_chunks.csv --queries 2000
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from typing import Callable, List, Sequence
+
+from fallback_handler import FallbackHandler
+
+SEED_QUERIES = [
+    "What courses does Lab of Future offer?",
+    "How do I enroll in the robotics program?",
+    "what's the weather like in Dubai today",
+    "Latest news about the elections",
+    "Can you help me debug my Python code?",
+    "I need relationship advice",
+    "Is there a certificate after the bootcamp?",
+    "Tell me about your company mission",
+    "Book me a flight to Paris",
+    "Do you offer programming courses for kids?",
+    "What are the fees for the summer workshop?",
+    "recommend a good movie",
+    "How much does the IoT Illuminations course cost?",
+    "Which stock should I buy?",
+    "Can I apply for a job at laboffuture?",
+    "Where is your office located?",
+    "hi",
+    "ok",
+    "Galactic Mechanics",
+    "my computer won't install the software",
+    "Is the platform login broken?",
+    "What is the syllabus of Space Explorers?",
+    "Give me a cooking recipe",
+    "Tell me a joke",
+]
+
+SEED_RESPONSES = [
+    "According to research shows that students learn faster.",
+    "Our courses run for eight weeks and include a certificate.",
+    "Generally speaking, experts say that third party tools help.",
+    "Beyond the classroom, learners build projects with external kits.",
+]
+
+
+class ReferenceHandler(FallbackHandler):
+    """The pre-matcher implementation: one `in` scan per topic per call"""
+
+    def is_educational_query(self, query: str, categories=None) -> bool:
+        query_lower = query.lower().strip()
+        if len(query_lower) < 3:
+            return False
+        for keyword in self.company_keywords:
+            if keyword in query_lower:
+                return True
+        for restricted in self.restricted_topics:
+            if restricted in query_lower:
+                company_context = any(keyword in query_lower for keyword in self.company_keywords[:5])
+                if not company_context:
+                    return False
+        allowed_count = sum(1 for topic in self.allowed_topics if topic in query_lower)
+        if allowed_count >= 2:
+            return True
+        if allowed_count >= 1:
+            return True
+        return True
+
+    def get_fallback_response(self, query: str, categories=None) -> str:
+        query_lower = query.lower().strip()
+        if any(topic in query_lower for topic in ["weather", "news", "politics"]):
+            return self._get_general_knowledge_fallback()
+        elif any(topic in query_lower for topic in ["health", "medical", "advice"]):
+            return self._get_advice_fallback()
+        elif any(topic in query_lower for topic in ["programming", "coding", "technical"]):
+            return self._get_technical_fallback()
+        else:
+            return self._get_standard_fallback()
+
+    def _contains_external_info(self, response: str) -> bool:
+        response_lower = response.lower()
+        external_count = sum(1 for indicator in self.external_indicators if indicator in response_lower)
+        return external_count >= 2
+
+
+def load_chunks(csv_path: str) -> List[str]:
+    csv.field_size_limit(10 ** 8)
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            chunks = [(row.get("chunk") or "").strip() for row in csv.DictReader(f)]
+    except FileNotFoundError:
+        print(f"{csv_path} not found, using the built-in corpus only")
+        return []
+    return list(dict.fromkeys(chunk for chunk in chunks if chunk))
+
+
+def build_queries(chunks: Sequence[str], count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    queries = list(SEED_QUERIES)
+    while chunks and len(queries) < count:
+        words = rng.choice(chunks).split()
+        if len(words) < 4:
+            continue
+        window = rng.randint(2, 12)
+        start = rng.randrange(0, max(1, len(words) - window))
+        queries.append(" ".join(words[start:start + window]))
+    return queries
+
+
+def time_per_call(fn: Callable[[str], object], texts: Sequence[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(texts))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check and time the FallbackHandler scope matcher")
+    parser.add_argument("--csv", default="../laboffuture_chunks.csv")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    chunks = load_chunks(args.csv)
+    queries = build_queries(chunks, args.queries, args.seed)
+    responses = SEED_RESPONSES + list(chunks[:500])
+
+    reference = ReferenceHandler()
+    handler = FallbackHandler()
+
+    mismatches = 0
+    for query in queries:
+        if reference.is_educational_query(query) != handler.is_educational_query(query):
+            mismatches += 1
+            print(f"is_educational_query mismatch: {query!r}")
+        if reference.get_fallback_response(query) != handler.get_fallback_response(query):
+            mismatches += 1
+            print(f"get_fallback_response mismatch: {query!r}")
+    for response in responses:
+        if reference._contains_external_info(response) != handler._contains_external_info(response):
+            mismatches += 1
+            print(f"_contains_external_info mismatch: {response[:60]!r}")
+
+    rejected = sum(1 for query in queries if not handler.is_educational_query(query))
+    print(f"{len(queries)} queries ({rejected} rejected), {len(responses)} responses, {mismatches} mismatches\n")
+
+    print(f"{'path':<28} {'reference us':>13} {'new us':>11} {'speedup':>8}")
+    rows = [
+        ("is_educational_query", reference.is_educational_query, handler.is_educational_query, queries),
+        ("get_fallback_response", reference.get_fallback_response, handler.get_fallback_response, queries),
+        ("_contains_external_info", reference._contains_external_info, handler._contains_external_info, responses),
+    ]
+    for name, ref_fn, new_fn, texts in rows:
+        ref_time = time_per_call(ref_fn, texts, args.repeat)
+        new_time = time_per_call(new_fn, texts, args.repeat)
+        print(f"{name:<28} {ref_time * 1e6:>13.2f} {new_time * 1e6:>11.2f} {ref_time / new_time:>7.1f}x")
+
+    # classify_query once, then both decisions from the same classification
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query in queries:
+            categories = handler.classify_query(query)
+            if not handler.is_educational_query(query, categories):
+                handler.get_fallback_response(query, categories)
+    shared = (time.perf_counter() - start) / (args.repeat * len(queries))
+    print(f"{'classify once + both':<28} {'':>13} {shared * 1e6:>11.2f}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,71 @@
 import re
-from typing import Tuple, List
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class TermMatcher:
+    """
+    Precompiled multi-pattern substring matcher.
+
+    All terms are compiled into one trie-shaped regex, so a single finditer
+    pass reports every term occurring anywhere in the text,
+    including terms that are prefixes of each other ("program"/"programming").
+    Each term ends in an empty marker group; the deepest marker reached at a
+    position identifies the longest term there, and its prefix terms come along.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self._term_categories: Dict[str, Set[str]] = {}
+        for category, terms in categories.items():
+            for term in terms:
+                self._term_categories.setdefault(term.lower(), set()).add(category)
+
+        trie: Dict[str, dict] = {}
+        for term in self._term_categories:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = term
+
+        # Group number -> the terms ending at or before that marker on its path
+        self._group_terms: List[Tuple[str, ...]] = [()]
+        # Consuming only the first character keeps matches overlapping and lets
+        # the regex engine skip ahead to positions where some term can start
+        branches = [
+            re.escape(char) + "(?=" + self._compile_node(child, ()) + ")"
+            for char, child in sorted(trie.items())
+        ]
+        self._pattern = re.compile("|".join(branches))
+
+    def _compile_node(self, node: dict, path_terms: Tuple[str, ...]) -> str:
+        marker = ""
+        if "" in node:
+            path_terms = path_terms + (node[""],)
+            self._group_terms.append(path_terms)
+            marker = "()"
+        branches = [
+            re.escape(char) + self._compile_node(child, path_terms)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return marker
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"{marker}(?:{body})?" if marker else body
+
+    def find_terms(self, text: str) -> Set[str]:
+        """Return the distinct terms occurring in an already-lowercased text"""
+        found: Set[str] = set()
+        for match in self._pattern.finditer(text):
+            found.update(self._group_terms[match.lastindex])
+        return found
+
+    def classify(self, text: str) -> Dict[str, Set[str]]:
+        """Return {category: matched terms} for an already-lowercased text"""
+        categories: Dict[str, Set[str]] = {}
+        for term in self.find_terms(text):
+            for category in self._term_categories[term]:
+                categories.setdefault(category, set()).add(term)
+        return categories
+
 
 class FallbackHandler:
     """Handles fallback responses and ensures chatbot stays within scope"""
@@ -12,6 +78,26 @@ class FallbackHandler:
         self.allowed_topics = self._get_allowed_topics()
         self.restricted_topics = self._get_restricted_topics()
         self.company_keywords = self._get_company_keywords()
+        self.external_indicators = self._get_external_indicators()
+        # Topics that pick a tailored fallback, checked in this order
+        self.fallback_topics = {
+            "general_knowledge": ["weather", "news", "politics"],
+            "advice": ["health", "medical", "advice"],
+            "technical": ["programming", "coding", "technical"],
+        }
+        self._tailored_fallbacks = [
+            ("general_knowledge", self.fallback_topics["general_knowledge"], self._get_general_knowledge_fallback),
+            ("advice", self.fallback_topics["advice"], self._get_advice_fallback),
+            ("technical", self.fallback_topics["technical"], self._get_technical_fallback),
+        ]
+
+        # Every query topic list compiled once into a single-pass matcher
+        self.query_matcher = TermMatcher({
+            "company": self.company_keywords,
+            "restricted": self.restricted_topics,
+            "allowed": self.allowed_topics,
+            **self.fallback_topics,
+        })
         
     def _get_allowed_topics(self) -> List[str]:
         """Define topics that are within the chatbot's scope"""
@@ -68,58 +154,66 @@ class FallbackHandler:
             "enroll", "register", "sign up", "join", "apply"
         ]
     
-    def is_educational_query(self, query: str) -> bool:
+    def _get_external_indicators(self) -> List[str]:
+        """Phrases suggesting a response draws on information outside the company"""
+        return [
+            "according to", "research shows", "studies indicate", "experts say",
+            "it is known that", "generally speaking", "in the real world",
+            "outside of", "beyond", "external", "third party"
+        ]
+
+    def classify_query(self, query: str) -> Dict[str, Set[str]]:
+        """
+        Match a query against every topic list in one pass.
+        Returns {category: matched terms} for the categories company, restricted,
+        allowed, general_knowledge, advice and technical; absent means no match.
+        """
+        return self.query_matcher.classify(query.lower().strip())
+
+    def is_educational_query(self, query: str, categories: Dict[str, Set[str]] = None) -> bool:
         """
         Determine if a query is within the educational/company scope
         Returns True if query should be processed, False if it should be rejected
+        Pass `categories` from classify_query to reuse an earlier classification.
         """
-        query_lower = query.lower().strip()
-        
         # Empty or very short queries
-        if len(query_lower) < 3:
+        if len(query.lower().strip()) < 3:
             return False
-        
-        # Check for company keywords (high priority)
-        for keyword in self.company_keywords:
-            if keyword in query_lower:
-                return True
-        
-        # Check for restricted topics (immediate rejection)
-        for restricted in self.restricted_topics:
-            if restricted in query_lower:
-                # Double-check if it's company-related despite restricted keyword
-                company_context = any(keyword in query_lower for keyword in self.company_keywords[:5])
-                if not company_context:
-                    return False
-        
-        # Check for allowed topics
-        allowed_count = sum(1 for topic in self.allowed_topics if topic in query_lower)
-        
-        # If query contains multiple allowed topics, it's likely relevant
-        if allowed_count >= 2:
-            return True
-        
-        # If query contains at least one allowed topic and isn't restricted, allow it
-        if allowed_count >= 1:
+
+        if categories is None:
+            categories = self.classify_query(query)
+
+        # Company keywords win over everything else
+        if "company" in categories:
             return True
-        
-        # Default to allowing queries that might be relevant
-        # This ensures we don't accidentally block legitimate questions
+
+        # Restricted topics without company context are rejected
+        if "restricted" in categories:
+            return False
+
+        # Allowed topics, or nothing recognisable: let it through so we don't
+        # accidentally block legitimate questions
         return True
-    
-    def get_fallback_response(self, query: str) -> str:
-        """Get appropriate fallback response for out-of-scope queries"""
-        query_lower = query.lower().strip()
-        
+
+    def get_fallback_response(self, query: str, categories: Dict[str, Set[str]] = None) -> str:
+        """
+        Get appropriate fallback response for out-of-scope queries
+        Pass `categories` from classify_query to reuse an earlier classification.
+        """
         # Detect specific types of restricted queries for tailored responses
-        if any(topic in query_lower for topic in ["weather", "news", "politics"]):
-            return self._get_general_knowledge_fallback()
-        elif any(topic in query_lower for topic in ["health", "medical", "advice"]):
-            return self._get_advice_fallback()
-        elif any(topic in query_lower for topic in ["programming", "coding", "technical"]):
-            return self._get_technical_fallback()
+        if categories is not None:
+            for topic, _, build in self._tailored_fallbacks:
+                if topic in categories:
+                    return build()
         else:
-            return self._get_standard_fallback()
+            # Without an earlier classification, plain `in` checks of these nine
+            # short terms are cheaper than a full classify_query (bench_scope.py)
+            query_lower = query.lower()
+            for _, terms, build in self._tailored_fallbacks:
+                for term in terms:
+                    if term in query_lower:
+                        return build()
+        return self._get_standard_fallback()
     
     def _get_standard_fallback(self) -> str:
         """Standard fallback response"""
@@ -169,17 +263,20 @@ I can help you with:
 
 Do you need help with any technical aspects of our platform or courses?"""
     
-    def process_response(self, response: str, original_query: str) -> Tuple[str, bool]:
+    def process_response(
+        self, response: str, original_query: str, categories: Dict[str, Set[str]] = None
+    ) -> Tuple[str, bool]:
         """
         Process the agent's response to ensure it stays within scope
         Returns: (processed_response, used_fallback)
+        Pass `categories` from classify_query(original_query) to reuse it.
         """
         if not response or len(response.strip()) < 10:
-            return self.get_fallback_response(original_query), True
+            return self.get_fallback_response(original_query, categories), True
         
         # Check if response seems to contain information outside our scope
         if self._contains_external_info(response):
-            return self.get_fallback_response(original_query), True
+            return self.get_fallback_response(original_query, categories), True
         
         # If response is good, return as-is
         return response, False
@@ -187,26 +284,25 @@ Do you need help with any technical aspects of our platform or courses?"""
     def _contains_external_info(self, response: str) -> bool:
         """Check if response contains information outside company scope"""
         response_lower = response.lower()
-        
-        # Indicators of external information
-        external_indicators = [
-            "according to", "research shows", "studies indicate", "experts say",
-            "it is known that", "generally speaking", "in the real world",
-            "outside of", "beyond", "external", "third party"
-        ]
-        
-        # Check for external information indicators
-        external_count = sum(1 for indicator in external_indicators if indicator in response_lower)
-        
-        # If response has multiple external indicators, it might be off-topic
-        return external_count >= 2
+
+        # A handful of long phrases over a long response: plain `in` scans beat
+        # the regex matcher here (bench_scope.py), so stop at the second hit
+        external_count = 0
+        for indicator in self.external_indicators:
+            if indicator in response_lower:
+                external_count += 1
+                # Multiple external indicators mean it might be off-topic
+                if external_count >= 2:
+                    return True
+        return False
     
-    def enhance_response(self, response: str, original_query: str) -> str:
+    def enhance_response(self, response: str, original_query: str, categories: Dict[str, Set[str]] = None) -> str:
         """
         Enhance response with company context and call-to-action
+        Pass `categories` from classify_query(original_query) to reuse it.
         """
         if not response:
-            return self.get_fallback_response(original_query)
+            return self.get_fallback_response(original_query, categories)
         
         # Don't enhance fallback responses (they're already complete)
         if "specifically designed to help" in response or "focus on providing" in response:
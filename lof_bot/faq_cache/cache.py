@@ -1,100 +1,80 @@
 # cache.py
 
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
-from sqlalchemy import select, update, insert, and_
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import NoResultFound
-import numpy as np
-from db import FAQCacheDB
-from embedding import embed_query
-from context import extract_context_tags
-from scipy.spatial.distance import cosine
+from sqlalchemy import select, text, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .faq_db import FAQCacheDB
+from .embedding import EmbeddingService, get_embedding_service
+from .context import ContextTagger, get_context_tagger
+from .stats_writer import WriteBehindStats
 
 
 class FAQCache:
-    def __init__(self, db_url: str, similarity_threshold: float = 0.85):
-        self.db = FAQCacheDB(db_url)
+    def __init__(
+        self,
+        db_url: str,
+        similarity_threshold: float = 0.85,
+        stats_flush_interval: float = 5.0,
+        embedding_service: Optional[EmbeddingService] = None,
+        context_tagger: Optional[ContextTagger] = None,
+        table_name: str = "faq_cache",
+        index_type: str = "hnsw",
+    ):
+        self.db = FAQCacheDB(db_url, table_name=table_name, index_type=index_type)
         self.table = self.db.get_table()
         self.engine = self.db.get_engine()
         self.similarity_threshold = similarity_threshold
-
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        # Handle zero vectors safely
-        if not vec1.any() or not vec2.any():
-            return 0.0
-        return 1 - cosine(vec1, vec2)
-
-    def _vector_search(self, query_embedding: List[float]) -> List[dict]:
+        # Cached embedder: the write path reuses the read path's embedding
+        self.embedder = embedding_service or get_embedding_service()
+        # Tags are compared as bitmasks; see faq_cache/context.py
+        self.tagger = context_tagger or get_context_tagger()
+        # Usage stats are coalesced per row id and flushed in the background
+        self.stats_writer = WriteBehindStats(
+            self.engine, self.table, "id", flush_interval=stats_flush_interval
+        )
+
+    def _best_match_query(self, query_embedding: List[float], query_tags: List[str]):
         """
-        Search cached queries whose embeddings have cosine similarity above threshold.
-        Returns a list of candidate rows as dicts with keys matching table columns.
+        Nearest cached query by cosine distance (`<=>`) that shares a context tag
+        and clears the similarity threshold. Both filters run in Postgres, so
+        only id, score and response of a single row come back.
         """
-        with self.engine.connect() as conn:
-            # Use raw SQL to perform vector similarity search with PGVector cosine operator
-            sql = f"""
-            SELECT id, query_text, response_text, embedding, context_tags, frequency, last_accessed
-            FROM {self.table.name}
-            ORDER BY embedding <-> :query_embedding
-            LIMIT 20;
-            """
-            result = conn.execute(sql, {"query_embedding": query_embedding}).fetchall()
-            candidates = []
-            for row in result:
-                candidates.append({
-                    "id": row[0],
-                    "query_text": row[1],
-                    "response_text": row[2],
-                    "embedding": row[3],
-                    "context_tags": row[4],
-                    "frequency": row[5],
-                    "last_accessed": row[6],
-                })
-            return candidates
-
-    def _filter_by_context(self, query_tags: List[str], candidates: List[dict]) -> List[dict]:
+        distance = self.table.c.embedding.cosine_distance(query_embedding)
+        stmt = (
+            select(self.table.c.id, (1 - distance).label("score"), self.table.c.response_text)
+            .where(distance < 1 - self.similarity_threshold)
+            .order_by(distance)
+            .limit(1)
+        )
+        if query_tags:
+            stmt = stmt.where(self.table.c.context_tags.overlap(query_tags))
+        return stmt
+
+    def _vector_search(self, query_embedding: List[float], query_tags: List[str]) -> Optional[Dict[str, Any]]:
         """
-        Filter cached query candidates by matching context tags.
-        Returns candidates that have at least one overlapping tag.
+        Run the best-match query. Returns {id, score, response_text} or None.
         """
-        if not query_tags:
-            return candidates  # No tags to filter, return all
-
-        filtered = []
-        query_tag_set = set(query_tags)
-        for c in candidates:
-            candidate_tags = set(c["context_tags"] or [])
-            if query_tag_set.intersection(candidate_tags):
-                filtered.append(c)
-        return filtered
+        with self.engine.begin() as conn:
+            # ef_search / probes for the current ANN index, scoped to this lookup
+            for setting in self.db.search_settings():
+                conn.execute(text(setting))
+            row = conn.execute(self._best_match_query(query_embedding, query_tags)).first()
+        if row is None:
+            return None
+        return {"id": row[0], "score": float(row[1]), "response_text": row[2]}
 
     def get_cached_response(self, query_text: str) -> Optional[str]:
         """
         Try to get a cached response for the query_text.
         Returns response text if a good match is found, else None.
         """
-        query_embedding = np.array(embed_query(query_text))
-        query_tags = extract_context_tags(query_text)
-
-        # 1. Search nearest neighbors by embedding distance
-        candidates = self._vector_search(query_embedding)
-
-        # 2. Filter candidates by context tag overlap
-        candidates = self._filter_by_context(query_tags, candidates)
-
-        # 3. Find best candidate above similarity threshold
-        best_match = None
-        best_score = 0.0
-        for c in candidates:
-            candidate_embedding = np.array(c["embedding"])
-            similarity = 1 - cosine(query_embedding, candidate_embedding)
-            if similarity > self.similarity_threshold and similarity > best_score:
-                best_score = similarity
-                best_match = c
+        query_embedding = self.embedder.embed(query_text)
+        query_tags = self.tagger.extract_tags(query_text)
 
+        best_match = self._vector_search(query_embedding, query_tags)
         if best_match:
-            # Update frequency and last_accessed asynchronously
+            # Update frequency and last_accessed via the write-behind aggregator
             self._update_usage(best_match["id"])
             return best_match["response_text"]
 
@@ -102,52 +82,43 @@ class FAQCache:
 
     def _update_usage(self, entry_id: int):
         """
-        Increment frequency and update last_accessed timestamp.
+        Queue a frequency/last_accessed update; never blocks on the database.
         """
-        with self.engine.connect() as conn:
-            stmt = (
-                update(self.table)
-                .where(self.table.c.id == entry_id)
-                .values(
-                    frequency=self.table.c.frequency + 1,
-                    last_accessed=datetime.utcnow()
-                )
-            )
-            conn.execute(stmt)
+        self.stats_writer.record(entry_id)
 
-    def cache_response(self, query_text: str, response_text: str):
+    def close(self):
+        """
+        Stop the background stats writer and flush pending increments.
+        """
+        self.stats_writer.close()
+
+    def cache_response(self, query_text: str, response_text: str, query_embedding: Optional[List[float]] = None):
         """
         Cache the query and response in the DB with embedding and context tags.
-        If the query already exists (exact text match), update usage stats.
+        If the query already exists (normalized text match), update usage stats.
+        One INSERT ... ON CONFLICT DO UPDATE, so concurrent misses for the same
+        question neither race into duplicates nor fail on the unique index.
         """
-        query_embedding = embed_query(query_text)
-        context_tags = extract_context_tags(query_text)
+        if query_embedding is None:
+            query_embedding = self.embedder.embed(query_text)
+        context_tags = self.tagger.extract_tags(query_text)
         now = datetime.utcnow()
 
-        with self.engine.begin() as conn:  # Transactional block
-            # Check if exact query already cached
-            stmt = select(self.table.c.id).where(self.table.c.query_text == query_text)
-            existing = conn.execute(stmt).first()
-
-            if existing:
-                entry_id = existing[0]
-                self._update_usage(entry_id)
-                # Optionally update response text here if changed
-                # update_stmt = (
-                #     update(self.table)
-                #     .where(self.table.c.id == entry_id)
-                #     .values(response_text=response_text, last_accessed=now)
-                # )
-                # conn.execute(update_stmt)
-            else:
-                # Insert new cache entry
-                ins = insert(self.table).values(
-                    query_text=query_text,
-                    response_text=response_text,
-                    embedding=query_embedding,
-                    context_tags=context_tags,
-                    frequency=1,
-                    created_at=now,
-                    last_accessed=now,
-                )
-                conn.execute(ins)
+        stmt = pg_insert(self.table).values(
+            query_text=query_text,
+            response_text=response_text,
+            embedding=query_embedding,
+            context_tags=context_tags,
+            frequency=1,
+            created_at=now,
+            last_accessed=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.db.query_key],
+            set_={"frequency": self.table.c.frequency + 1, "last_accessed": now},
+        ).returning(literal_column("xmax = 0").label("inserted"))
+
+        with self.engine.begin() as conn:
+            inserted = conn.execute(stmt).scalar()
+        if inserted:
+            self.db.record_inserts()
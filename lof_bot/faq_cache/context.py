@@ -1,6 +1,10 @@
 
-from typing import List, Set
+import csv
+import os
 import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 
 # Define keywords or patterns relevant to your domain for context extraction
 KEYWORDS = {
@@ -24,20 +28,209 @@ KEYWORDS = {
     "short course",
     "diploma",
     "degree",
+    # Lab of Future programmes and places
+    "space",
+    "astronomy",
+    "robotics",
+    "aeromodelling",
+    "internet of things",
+    "iot",
+    "summer camp",
+    "camp",
+    "workshop",
+    "lab tour",
+    "school in space",
+    "after school",
+    "internship",
+    "ambassador",
+    "careers",
+    "dubai",
+    "fees",
+    "enrollment",
 }
 
+# URL slugs that are site plumbing rather than courses or topics
+_IGNORED_SLUGS = {
+    "", "blogs", "contact", "contactus", "jobs", "login", "signin", "signup",
+    "reset_password", "newsletter", "refund policy", "cart",
+}
+
+
+class ContextTagger:
+    """
+    Tags text with the taxonomy keywords it mentions, in one regex scan.
+
+    The taxonomy is compiled once into a trie-shaped regex. Every keyword ends
+    in an optional `\\b()` marker group, so overlapping keywords that share a
+    start ("summer camp" / "summer camp dubai") are all reported, with the same
+    whole-word semantics as one `\\b...\\b` search per keyword.
+    Tag i of `tags` is bit i of the masks returned by extract_mask.
+    """
+
+    def __init__(self, tags: Iterable[str]):
+        self.tags: List[str] = sorted({tag.strip().lower() for tag in tags if tag.strip()})
+        self.bits: Dict[str, int] = {tag: 1 << i for i, tag in enumerate(self.tags)}
+
+        trie: Dict[str, dict] = {}
+        for tag in self.tags:
+            node = trie
+            for char in tag:
+                node = node.setdefault(char, {})
+            node[""] = tag
+
+        # Group number -> tag bit, and the marker groups of its prefix tags
+        self._group_bits: List[int] = [0]
+        self._group_prefixes: List[Tuple[int, ...]] = [()]
+        branches = [
+            re.escape(char) + "(?=" + self._compile_node(child, ()) + ")"
+            for char, child in sorted(trie.items())
+        ]
+        self._pattern = re.compile(r"\b(?:" + "|".join(branches) + ")") if branches else None
+
+    def _compile_node(self, node: dict, prefix_groups: Tuple[int, ...]) -> str:
+        marker = ""
+        if "" in node:
+            group = len(self._group_bits)
+            self._group_bits.append(self.bits[node[""]])
+            self._group_prefixes.append(prefix_groups)
+            prefix_groups = prefix_groups + (group,)
+            marker = r"(?:\b())?"
+        branches = [
+            re.escape(char) + self._compile_node(child, prefix_groups)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return marker
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"{marker}(?:{body})?"
+
+    def extract_mask(self, text: str) -> int:
+        """Bitmask of the tags found in the text"""
+        if self._pattern is None:
+            return 0
+        mask = 0
+        for match in self._pattern.finditer(text.lower()):
+            group = match.lastindex
+            if group is None:
+                continue
+            # The deepest keyword matched here; shorter ones share its start
+            mask |= self._group_bits[group]
+            for prefix in self._group_prefixes[group]:
+                if match.start(prefix) != -1:
+                    mask |= self._group_bits[prefix]
+        return mask
+
+    def extract_tags(self, text: str) -> List[str]:
+        """Sorted list of the tags found in the text"""
+        return self.tags_of(self.extract_mask(text))
+
+    def mask_of(self, tags: Optional[Iterable[str]]) -> int:
+        """Bitmask of a stored tag list; tags outside the taxonomy are ignored"""
+        mask = 0
+        for tag in tags or ():
+            mask |= self.bits.get(tag, 0)
+        return mask
+
+    def tags_of(self, mask: int) -> List[str]:
+        """Tag names for the bits set in a mask"""
+        tags = []
+        while mask:
+            low = mask & -mask
+            tags.append(self.tags[low.bit_length() - 1])
+            mask ^= low
+        return tags
+
+
+def load_taxonomy(path: str) -> Set[str]:
+    """
+    Read a taxonomy file: one tag per line, '#' starts a comment.
+    """
+    tags = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            tag = line.split("#", 1)[0].strip().lower()
+            if tag:
+                tags.add(tag)
+    return tags
+
+
+def mine_url_tags(csv_path: str) -> Set[str]:
+    """
+    Course and page names from the URL slugs in the chunk CSV,
+    e.g. /galactic-mechanics -> "galactic mechanics".
+    """
+    csv.field_size_limit(10 ** 8)
+    tags = set()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            slug = urlparse(row.get("url") or "").path.rstrip("/").rsplit("/", 1)[-1].lower()
+            words = [word for word in slug.split("-") if word]
+            # Drop form markers and numeric suffixes (form-..., ...-form, about-us-1)
+            if words and words[0] == "form":
+                words = words[1:]
+            while words and (words[-1].isdigit() or words[-1] == "form"):
+                words.pop()
+            tag = " ".join(words)
+            if tag not in _IGNORED_SLUGS and len(tag) > 2:
+                tags.add(tag)
+    return tags
+
+
+_default_tagger: Optional[ContextTagger] = None
+_default_tagger_lock = threading.Lock()
+
+
+def get_context_tagger() -> ContextTagger:
+    """
+    Process-wide tagger over KEYWORDS plus the taxonomy file named by
+    LOF_CONTEXT_TAXONOMY, when set.
+    """
+    global _default_tagger
+    with _default_tagger_lock:
+        if _default_tagger is None:
+            tags = set(KEYWORDS)
+            taxonomy_path = os.getenv("LOF_CONTEXT_TAXONOMY")
+            if taxonomy_path:
+                tags |= load_taxonomy(taxonomy_path)
+            _default_tagger = ContextTagger(tags)
+        return _default_tagger
+
+
+def set_context_tagger(tagger: ContextTagger):
+    """
+    Replace the process-wide tagger, e.g. with a custom taxonomy.
+    """
+    global _default_tagger
+    with _default_tagger_lock:
+        _default_tagger = tagger
+
+
 def extract_context_tags(text: str) -> List[str]:
     """
     Extract context tags from the input text based on keyword matching.
     This can be replaced or extended with an NLP library like spaCy for entity recognition.
     """
-    text_lower = text.lower()
-    found_tags: Set[str] = set()
+    return get_context_tagger().extract_tags(text)
+
+
+def extract_context_mask(text: str) -> int:
+    """
+    Context tags of the input text as a bitmask (see ContextTagger).
+    """
+    return get_context_tagger().extract_mask(text)
+
+
+if __name__ == "__main__":
+    import argparse
 
-    # Simple keyword matching
-    for keyword in KEYWORDS:
-        # Using word boundaries to avoid partial matches
-        if re.search(rf"\b{re.escape(keyword)}\b", text_lower):
-            found_tags.add(keyword)
+    parser = argparse.ArgumentParser(description="Write a context taxonomy mined from the chunk CSV URLs")
+    parser.add_argument("--csv", default="../laboffuture_chunks.csv")
+    parser.add_argument("--out", default="context_taxonomy.txt")
+    args = parser.parse_args()
 
-    return list(found_tags)
+    mined = mine_url_tags(args.csv)
+    with open(args.out, "w", encoding="utf-8") as out:
+        out.write("# Context tags mined from laboffuture_chunks.csv URLs; one per line\n")
+        for tag in sorted(mined):
+            out.write(tag + "\n")
+    print(f"Wrote {len(mined)} tags to {args.out}")
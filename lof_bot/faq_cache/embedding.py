@@ -1,25 +1,435 @@
-from typing import List
+import abc
+import array
+import hashlib
 import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Tuple
 
-# Example using OpenAI embeddings API; replace with your actual model or API
-import openai
+import numpy as np
 
-# Load your OpenAI API key from environment variables or config
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("Please set the OPENAI_API_KEY environment variable")
+from .lru import TTLLRUCache
 
-openai.api_key = OPENAI_API_KEY
+# Dimension of the faq_cache.embedding column; backends default to it
+DEFAULT_DIMENSIONS = int(os.getenv("LOF_EMBEDDING_DIM", "1536"))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for cache keys: trim, collapse whitespace, lowercase.
+    """
+    return " ".join(text.split()).lower()
+
+
+def _ngram_features(tokens: List[str]) -> List[str]:
+    """Word unigrams and bigrams of a token list."""
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _hash_feature(feature: str, dimensions: int) -> Tuple[int, float]:
+    """Bucket and random sign of a feature for signed feature hashing."""
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest[:4], "little") % dimensions, 1.0 if digest[4] & 1 else -1.0
+
+
+class EmbeddingBackend(abc.ABC):
+    """
+    Interface for embedding providers. embed_batch gets many texts per call.
+    """
+    model: str = "base"
+    dimensions: int = DEFAULT_DIMENSIONS
+
+    @abc.abstractmethod
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed a batch of texts, one vector per text in order."""
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """
+    OpenAI embeddings API; one request embeds a whole batch.
+    """
+
+    def __init__(
+        self,
+        model: str = "text-embedding-3-large",
+        api_key: Optional[str] = None,
+        dimensions: int = DEFAULT_DIMENSIONS,
+    ):
+        # Example using OpenAI embeddings API; replace with your actual model or API
+        import openai
+
+        # Load your OpenAI API key from environment variables or config
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Please set the OPENAI_API_KEY environment variable")
+        openai.api_key = api_key
+        self._openai = openai
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        # text-embedding-3 models can shorten their output to fit the Vector column
+        response = self._openai.Embedding.create(input=list(texts), model=self.model, dimensions=self.dimensions)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic offline backend: hashes word unigrams and bigrams into a
+    fixed-size signed vector. No network, stable across runs; meant for
+    tests and air-gapped development.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for feature in _ngram_features(normalize_text(text).split()):
+            bucket, sign = _hash_feature(feature, self.dimensions)
+            vector[bucket] += sign
+        norm = sum(v * v for v in vector) ** 0.5
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class TfidfHashingBackend(EmbeddingBackend):
+    """
+    Local CPU backend: hashed TF-IDF projection computed in NumPy batches.
+
+    Unigrams and bigrams are hashed with a random sign straight into
+    `dimensions` buckets, weighted by sublinear term frequency and an IDF
+    vector fitted on a corpus (e.g. the chunk column of
+    laboffuture_chunks.csv), then L2-normalised so cosine matches pgvector's.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS, idf: Optional[np.ndarray] = None):
+        self.dimensions = dimensions
+        self.idf = idf if idf is not None else np.ones(dimensions, dtype=np.float32)
+        fingerprint = hashlib.sha1(self.idf.tobytes()).hexdigest()[:8]
+        self.model = f"tfidf-hashing-{dimensions}-{fingerprint}"
+        self._feature_cache = TTLLRUCache(max_size=200000, ttl_seconds=float("inf"))
+
+    def _feature(self, feature: str):
+        hashed = self._feature_cache.get(feature)
+        if hashed is None:
+            hashed = _hash_feature(feature, self.dimensions)
+            self._feature_cache.put(feature, hashed)
+        return hashed
+
+    def _features(self, text: str):
+        return _ngram_features(_TOKEN_PATTERN.findall(text.lower()))
+
+    def _term_matrix(self, texts: Sequence[str]):
+        """Signed hashed term counts for a batch, shape (len(texts), dimensions)."""
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                bucket, sign = self._feature(feature)
+                rows.append(row)
+                cols.append(bucket)
+                signs.append(sign)
+        counts = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(counts, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), np.asarray(signs, dtype=np.float32))
+        return counts
+
+    def embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings for a batch as a float32 matrix."""
+        counts = self._term_matrix(texts)
+        weights = np.sign(counts) * np.log1p(np.abs(counts)) * self.idf
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        return weights / np.where(norms == 0, 1.0, norms)
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    @classmethod
+    def fit(cls, corpus: Sequence[str], dimensions: int = DEFAULT_DIMENSIONS) -> "TfidfHashingBackend":
+        """
+        Fit bucket IDF weights on a corpus of documents.
+        """
+        backend = cls(dimensions)
+        document_frequency = np.zeros(dimensions, dtype=np.float64)
+        for start in range(0, len(corpus), 512):
+            counts = backend._term_matrix(corpus[start:start + 512])
+            document_frequency += (counts != 0).sum(axis=0)
+        idf = np.log((1 + len(corpus)) / (1 + document_frequency)) + 1.0
+        return cls(dimensions, idf.astype(np.float32))
+
+    def save(self, path: str):
+        np.save(path, self.idf)
+
+    @classmethod
+    def load(cls, path: str) -> "TfidfHashingBackend":
+        idf = np.load(path)
+        return cls(len(idf), idf.astype(np.float32))
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Local CPU backend using a small sentence-transformers model.
+    Output is zero-padded to `dimensions`, which leaves cosine unchanged.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", dimensions: int = DEFAULT_DIMENSIONS, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name, device="cpu")
+        native = self._model.get_sentence_embedding_dimension()
+        if native > dimensions:
+            raise ValueError(f"{model_name} produces {native} dims, more than the configured {dimensions}")
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.model = f"st-{model_name}-{dimensions}"
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            list(texts), batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+        padded = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        padded[:, :vectors.shape[1]] = vectors
+        return padded.tolist()
+
+
+def create_backend(name: Optional[str] = None, dimensions: int = DEFAULT_DIMENSIONS) -> EmbeddingBackend:
+    """
+    Build a backend by name: openai, hashing, tfidf or sentence-transformers.
+    Defaults to LOF_EMBEDDING_BACKEND (openai). The tfidf backend needs IDF
+    weights fitted on the corpus, loaded from LOF_TFIDF_IDF.
+    """
+    name = name or os.getenv("LOF_EMBEDDING_BACKEND", "openai")
+    if name == "openai":
+        return OpenAIEmbeddingBackend(dimensions=dimensions)
+    if name == "hashing":
+        return HashingEmbeddingBackend(dimensions)
+    if name == "tfidf":
+        idf_path = os.getenv("LOF_TFIDF_IDF")
+        if not idf_path:
+            # Unfitted all-ones IDF weighs every term alike and silently loses recall
+            raise ValueError(
+                "The tfidf backend needs fitted IDF weights: set LOF_TFIDF_IDF to a file written by "
+                "`python bench_embedding.py --backends tfidf --save-idf <path>`"
+            )
+        return TfidfHashingBackend.load(idf_path)
+    if name == "sentence-transformers":
+        return SentenceTransformerBackend(os.getenv("LOF_ST_MODEL", "all-MiniLM-L6-v2"), dimensions)
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+class DiskEmbeddingCache:
+    """
+    SQLite-backed persistent cache of embeddings stored as float32 blobs.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return array.array("f", row[0]).tolist()
+
+    def put_many(self, items: Dict[str, List[float]]):
+        rows = [(key, array.array("f", vector).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+
+class _MicroBatcher:
+    """
+    Collects concurrent embed requests for up to max_wait seconds (or
+    max_batch texts) and sends them to the backend as one call.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_batch: int, max_wait: float, on_batch):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.on_batch = on_batch
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Identical texts in one batch are embedded once
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(unique_texts, self.backend.embed_batch(unique_texts)))
+                self.on_batch(vectors)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+
+class EmbeddingService:
+    """
+    Cached, micro-batched query embedding.
+
+    Lookups go memory LRU -> optional disk cache -> backend. Keys are
+    (model, normalized text), so a query embedded on the cache read path
+    is free on the write path. Concurrent misses are merged into single
+    backend calls.
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache_size: int = 10000,
+        disk_cache_path: Optional[str] = None,
+        max_batch: int = 64,
+        max_wait: float = 0.005,
+    ):
+        self.backend = backend
+        self.memory_cache = TTLLRUCache(max_size=cache_size, ttl_seconds=float("inf"))
+        self.disk_cache = DiskEmbeddingCache(disk_cache_path) if disk_cache_path else None
+        self._batcher = _MicroBatcher(backend, max_batch, max_wait, self._store_batch)
+        self.disk_hits = 0
+        self.backend_calls = 0
+        self.texts_embedded = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.backend.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _store_batch(self, vectors: Dict[str, List[float]]):
+        self.backend_calls += 1
+        self.texts_embedded += len(vectors)
+        for text, vector in vectors.items():
+            self.memory_cache.put(self._key(text), vector)
+        if self.disk_cache is not None:
+            self.disk_cache.put_many({self._key(text): vector for text, vector in vectors.items()})
+
+    def _lookup(self, normalized: str) -> Optional[List[float]]:
+        key = self._key(normalized)
+        vector = self.memory_cache.get(key)
+        if vector is None and self.disk_cache is not None:
+            vector = self.disk_cache.get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                self.memory_cache.put(key, vector)
+        return vector
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embedding for one text, from cache when possible.
+        """
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embeddings for several texts; all misses go out in shared backend calls.
+        """
+        normalized = [normalize_text(text) for text in texts]
+        results: List[Optional[List[float]]] = [self._lookup(text) for text in normalized]
+        missing = dict.fromkeys(text for text, vector in zip(normalized, results) if vector is None)
+        futures = {text: self._batcher.submit(text) for text in missing}
+        return [
+            vector if vector is not None else futures[text].result()
+            for text, vector in zip(normalized, results)
+        ]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "model": self.backend.model,
+            "memory_cache": self.memory_cache.stats(),
+            "disk_hits": self.disk_hits,
+            "backend_calls": self.backend_calls,
+            "texts_embedded": self.texts_embedded,
+        }
+
+
+_default_service: Optional[EmbeddingService] = None
+_default_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """
+    Process-wide embedding service. LOF_EMBEDDING_BACKEND selects the backend
+    (see create_backend); LOF_EMBEDDING_CACHE sets a disk cache path.
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = EmbeddingService(create_backend(), disk_cache_path=os.getenv("LOF_EMBEDDING_CACHE"))
+        return _default_service
+
+
+def set_embedding_service(service: EmbeddingService):
+    """
+    Replace the process-wide embedding service, e.g. with a local backend in tests.
+    """
+    global _default_service
+    with _default_service_lock:
+        _default_service = service
 
 
 def embed_query(text: str) -> List[float]:
     """
-    Generate an embedding vector for the given text using OpenAI's embedding model.
+    Generate an embedding vector for the given text.
     Returns a list of floats representing the embedding.
     """
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-3-large"  # or whichever embedding model you prefer
-    )
-    embedding = response["data"][0]["embedding"]
-    return embedding
+    return get_embedding_service().embed(text)
+
+
+def as_agno_embedder(service: EmbeddingService):
+    """
+    Wrap an embedding service as an agno Embedder so PgVector retrieval can
+    use the same (possibly local) backend and cache.
+    """
+    from agno.embedder.base import Embedder
+
+    class ServiceEmbedder(Embedder):
+        def get_embedding(self, text: str) -> List[float]:
+            return service.embed(text)
+
+        def get_embedding_and_usage(self, text: str):
+            return service.embed(text), None
+
+        async def async_get_embedding(self, text: str) -> List[float]:
+            import asyncio
+            return await asyncio.to_thread(service.embed, text)
+
+        async def async_get_embedding_and_usage(self, text: str):
+            return await self.async_get_embedding(text), None
+
+    # The base Embedder dataclass only declares dimensions; id is informational
+    embedder = ServiceEmbedder(dimensions=service.backend.dimensions)
+    embedder.id = service.backend.model
+    return embedder
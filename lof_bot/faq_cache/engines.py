@@ -0,0 +1,205 @@
+# engines.py
+
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Requests the API runs at once (api.py reads the same variable); while it
+# holds its admission slot a request uses at most one connection per engine
+REQUEST_CONCURRENCY = int(os.getenv("LOF_API_MAX_CONCURRENCY", "32"))
+# Request work that outlives the slot and still holds a connection: FAQ cache
+# writes finishing after the response and knowledge searches left running on
+# a cache hit. main.py runs at most this many at once.
+TRAILING_CONNECTIONS = int(os.getenv("LOF_DB_TRAILING_CONNECTIONS", "4"))
+# Plus one each for the write-behind stats flusher and the ANN index builder
+BACKGROUND_CONNECTIONS = TRAILING_CONNECTIONS + 2
+
+# Pool defaults; every component sharing a URL gets the same pool. Overflow
+# tops the pool up to one connection per admitted request plus the background
+# ones, so checkouts never wait behind the API's own admission limit.
+POOL_SIZE = int(os.getenv("LOF_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv(
+    "LOF_DB_MAX_OVERFLOW", str(max(REQUEST_CONCURRENCY + BACKGROUND_CONNECTIONS - POOL_SIZE, 0))
+))
+POOL_TIMEOUT = float(os.getenv("LOF_DB_POOL_TIMEOUT", "10"))
+POOL_RECYCLE = int(os.getenv("LOF_DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("LOF_DB_POOL_PRE_PING", "1") != "0"
+STATEMENT_TIMEOUT_MS = int(os.getenv("LOF_DB_STATEMENT_TIMEOUT_MS", "15000"))
+# Checkouts waiting longer than this count as slow
+SLOW_CHECKOUT_SECONDS = float(os.getenv("LOF_DB_SLOW_CHECKOUT", "0.05"))
+
+
+class PoolMetrics:
+    """
+    Checkout wait times of one pool, recorded by the timed pool classes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "slow_checkouts": self.slow_checkouts,
+                "checkout_timeouts": self.timeouts,
+                "avg_checkout_wait": self.total_wait / attempts if attempts else 0.0,
+                "max_checkout_wait": self.max_wait,
+            }
+
+
+class _TimedCheckout:
+    """
+    Pool mixin timing how long each checkout waits for a connection.
+    """
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+_engines: Dict[Tuple[str, bool], Any] = {}
+_engines_lock = threading.Lock()
+
+
+def _engine_options(db_url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    engine_options = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+    statement_timeout_ms = options.pop("statement_timeout_ms", STATEMENT_TIMEOUT_MS)
+    engine_options.update(options)
+    if statement_timeout_ms and make_url(db_url).get_backend_name() == "postgresql":
+        connect_args = dict(engine_options.get("connect_args") or {})
+        connect_args.setdefault("options", f"-c statement_timeout={int(statement_timeout_ms)}")
+        engine_options["connect_args"] = connect_args
+    return engine_options
+
+
+def get_engine(db_url: str, **options) -> Engine:
+    """
+    Process-wide engine for db_url, created on first use.
+    Options (pool_size, max_overflow, pool_timeout, pool_pre_ping,
+    statement_timeout_ms, ...) only apply to that first call; they default
+    to the LOF_DB_* environment variables.
+    """
+    with _engines_lock:
+        engine = _engines.get((db_url, False))
+        if engine is None:
+            engine = create_engine(db_url, poolclass=TimedQueuePool, **_engine_options(db_url, options))
+            engine.pool.metrics = PoolMetrics()
+            _engines[(db_url, False)] = engine
+        return engine
+
+
+def get_async_engine(db_url: str, **options) -> AsyncEngine:
+    """
+    Process-wide async engine for db_url; same options as get_engine.
+    """
+    with _engines_lock:
+        engine = _engines.get((db_url, True))
+        if engine is None:
+            engine = create_async_engine(db_url, poolclass=TimedAsyncQueuePool, **_engine_options(db_url, options))
+            engine.sync_engine.pool.metrics = PoolMetrics()
+            _engines[(db_url, True)] = engine
+        return engine
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Size, checked-out connections, saturation and checkout waits per engine,
+    keyed by URL (password hidden), with an " (async)" suffix for async engines.
+    """
+    with _engines_lock:
+        engines = list(_engines.items())
+    stats = {}
+    for (db_url, is_async), engine in engines:
+        pool = engine.sync_engine.pool if is_async else engine.pool
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        name = make_url(db_url).render_as_string(hide_password=True) + (" (async)" if is_async else "")
+        stats[name] = {
+            "pool_size": pool.size(),
+            "capacity": capacity,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": checked_out / capacity if capacity else 0.0,
+            **pool.metrics.stats(),
+        }
+    return stats
+
+
+def check_pool_capacity(concurrency: int) -> None:
+    """
+    Raise if a pool, or the LOF_DB_* defaults for pools not created yet,
+    holds fewer connections than concurrency requests need at once.
+    Otherwise requests past the pool fail with a checkout TimeoutError after
+    LOF_DB_POOL_TIMEOUT instead of being shed by admission control.
+    """
+    capacities = {"LOF_DB_POOL_SIZE + LOF_DB_MAX_OVERFLOW": POOL_SIZE + max(MAX_OVERFLOW, 0)}
+    capacities.update((name, stats["capacity"]) for name, stats in pool_stats().items())
+    too_small = {name: capacity for name, capacity in capacities.items() if capacity < concurrency}
+    if too_small:
+        raise RuntimeError(
+            f"Database pool capacity {too_small} is below the {concurrency} concurrent requests admitted; "
+            f"raise LOF_DB_MAX_OVERFLOW or lower LOF_API_MAX_CONCURRENCY"
+        )
+
+
+def dispose_engines():
+    """
+    Close every pooled connection, e.g. after forking worker processes.
+    """
+    with _engines_lock:
+        engines = list(_engines.items())
+    for (_, is_async), engine in engines:
+        (engine.sync_engine if is_async else engine).dispose()
@@ -1,21 +1,62 @@
+import logging
+import math
+import re
+import threading
 from sqlalchemy import (
-    create_engine, Table, Column, Integer, Text, DateTime, MetaData, String, ARRAY
+    Table, Column, Integer, Text, DateTime, MetaData, String, Index, text, func
 )
+from sqlalchemy.dialects.postgresql import ARRAY
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.exc import OperationalError
 from datetime import datetime
+from typing import Dict, List, Optional
+
+from .engines import get_engine
+
+logger = logging.getLogger(__name__)
+
+# FAQCache ranks by cosine distance (`<=>`); only this operator class serves it
+EMBEDDING_OPS = "vector_cosine_ops"
+INDEX_TYPES = ("hnsw", "ivfflat")
 
 
 class FAQCacheDB:
     """
     Handles PostgreSQL connection and FAQ cache table setup.
     Requires PGVector extension enabled in your Postgres database.
+
+    The ANN index on `embedding` is managed by ensure_index(): nothing below
+    index_min_rows (an exact scan is fast and has perfect recall there), then
+    HNSW or IVFFlat with vector_cosine_ops. IVFFlat lists are sized from the
+    row count and the index is rebuilt once the table outgrows them.
     """
 
-    def __init__(self, db_url: str, table_name: str = "faq_cache"):
+    def __init__(
+        self,
+        db_url: str,
+        table_name: str = "faq_cache",
+        index_type: str = "hnsw",
+        index_min_rows: int = 1000,
+        index_check_interval: int = 500,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 64,
+        ef_search: int = 100,
+        probes: Optional[int] = None,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {index_type!r}")
         self.db_url = db_url
         self.table_name = table_name
-        self.engine = create_engine(self.db_url)
+        self.index_name = f"idx_{table_name}_embedding"
+        self.index_type = index_type
+        self.index_min_rows = index_min_rows
+        self.index_check_interval = index_check_interval
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.ef_search = ef_search
+        self.probes = probes
+        # Shared, pool-limited engine; see faq_cache/engines.py
+        self.engine = get_engine(self.db_url)
         self.metadata = MetaData()
 
         self.table = Table(
@@ -24,14 +65,27 @@ class FAQCacheDB:
             Column("id", Integer, primary_key=True, autoincrement=True),
             Column("query_text", Text, nullable=False),
             Column("response_text", Text, nullable=False),
-            Column("embedding", VECTOR(1536), nullable=False),
+            Column("embedding", Vector(1536), nullable=False),
             Column("context_tags", ARRAY(String), nullable=False, default=[]),
             Column("frequency", Integer, nullable=False, default=1),
             Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
             Column("last_accessed", DateTime, nullable=False, default=datetime.utcnow),
+            # GIN index so `context_tags && :tags` is answered from the index
+            Index(f"idx_{self.table_name}_context_tags", "context_tags", postgresql_using="gin"),
         )
+        # One row per normalized question; cache writes upsert on this key
+        self.query_key = func.lower(func.btrim(self.table.c.query_text))
+        Index(f"uq_{self.table_name}_query_key", self.query_key, unique=True)
+
+        # Current ANN index as (type, lists); lists is None for HNSW
+        self.index_state: Optional[tuple] = None
+        self._inserts_since_check = 0
+        self._counter_lock = threading.Lock()
+        # Serializes index builds; never taken on the request path
+        self._index_lock = threading.Lock()
 
         self._create_table()
+        self.ensure_index()
 
     def _create_table(self):
         """
@@ -39,20 +93,204 @@ class FAQCacheDB:
         Ensure PGVector extension is enabled in the DB.
         """
         try:
-            with self.engine.connect() as conn:
+            with self.engine.begin() as conn:
                 # Enable pgvector extension if not already enabled
-                conn.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-                self.metadata.create_all(self.engine)
-                # Create ivfflat index on embedding column for efficient similarity search
-                create_index_sql = f"""
-                CREATE INDEX IF NOT EXISTS idx_{self.table_name}_embedding 
-                ON {self.table_name} USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
-                """
-                conn.execute(create_index_sql)
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
+            self.metadata.create_all(self.engine)
+            with self.engine.begin() as conn:
+                # create_all skips indexes on tables that already exist
+                conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_{self.table_name}_context_tags
+                ON {self.table_name} USING gin (context_tags);
+                """))
+                has_key = conn.execute(
+                    text("SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+                    {"table": self.table_name, "index": f"uq_{self.table_name}_query_key"},
+                ).scalar()
+            if not has_key:
+                self._add_query_key()
         except OperationalError as e:
             print("Database operational error:", e)
             raise
 
+    def _add_query_key(self):
+        """
+        Add the unique index on lower(btrim(query_text)) to a table created
+        before it existed. Duplicate rows are folded into the oldest one first.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+            WITH ranked AS (
+                SELECT id,
+                       min(id) OVER (PARTITION BY lower(btrim(query_text))) AS keep_id,
+                       sum(frequency) OVER (PARTITION BY lower(btrim(query_text))) AS total
+                FROM {self.table_name}
+            ), merged AS (
+                UPDATE {self.table_name} t SET frequency = r.total
+                FROM ranked r WHERE t.id = r.id AND r.id = r.keep_id AND r.total <> t.frequency
+            )
+            DELETE FROM {self.table_name} t USING ranked r
+            WHERE t.id = r.id AND r.id <> r.keep_id;
+            """))
+            conn.execute(text(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_{self.table_name}_query_key
+            ON {self.table_name} (lower(btrim(query_text)));
+            """))
+
+    @staticmethod
+    def ivfflat_lists(rows: int) -> int:
+        """pgvector's sizing rule: rows / 1000 up to 1M rows, sqrt(rows) beyond"""
+        if rows <= 1_000_000:
+            return max(1, rows // 1000)
+        return int(math.sqrt(rows))
+
+    def _existing_index(self, conn) -> Optional[tuple]:
+        """
+        (type, lists) of the current embedding index, ("other", None) if unusable
+        and ("invalid", None) if a failed CONCURRENTLY build left it INVALID.
+        """
+        row = conn.execute(
+            text("""
+            SELECT ix.indexdef, i.indisvalid
+            FROM pg_indexes ix
+            JOIN pg_index i ON i.indexrelid = format('%I.%I', ix.schemaname, ix.indexname)::regclass
+            WHERE ix.tablename = :table AND ix.indexname = :index
+            """),
+            {"table": self.table_name, "index": self.index_name},
+        ).first()
+        if row is None:
+            return None
+        indexdef, valid = row
+        if not valid:
+            # Postgres never uses it, and IF NOT EXISTS would skip recreating it
+            return ("invalid", None)
+        method = re.search(r"USING (\w+)", indexdef)
+        method = method.group(1) if method else ""
+        if method not in INDEX_TYPES or EMBEDDING_OPS not in indexdef:
+            return ("other", None)
+        lists = re.search(r"lists='?(\d+)", indexdef)
+        return (method, int(lists.group(1)) if lists else None)
+
+    def _wanted_index(self, rows: int) -> Optional[tuple]:
+        if rows < self.index_min_rows:
+            return None
+        if self.index_type == "ivfflat":
+            return ("ivfflat", self.ivfflat_lists(rows))
+        return ("hnsw", None)
+
+    def _needs_rebuild(self, existing: tuple, wanted: tuple) -> bool:
+        if existing[0] != wanted[0]:
+            return True
+        # IVFFlat centroids come from the rows present at build time
+        if wanted[0] == "ivfflat":
+            return not (wanted[1] / 2 <= (existing[1] or 0) <= wanted[1] * 2)
+        return False
+
+    def ensure_index(self) -> Optional[str]:
+        """
+        Create, rebuild or drop the embedding ANN index to match the table size.
+        Returns "created", "rebuilt", "dropped", "failed" or None when nothing
+        changed. Builds run CONCURRENTLY so lookups and writes continue meanwhile.
+        A failed build is logged and its INVALID leftover dropped; the next
+        check tries again.
+        """
+        with self._index_lock:
+            with self._counter_lock:
+                self._inserts_since_check = 0
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(f"SELECT count(*) FROM {self.table_name}")).scalar()
+                existing = self._existing_index(conn)
+            wanted = self._wanted_index(rows)
+
+            action = None
+            if wanted is None:
+                # An IVFFlat index trained on (almost) no rows only hurts recall
+                if existing is not None and existing[0] != "hnsw":
+                    action = "dropped"
+            elif existing is None:
+                action = "created"
+            elif self._needs_rebuild(existing, wanted):
+                action = "rebuilt"
+
+            if action is not None:
+                try:
+                    with self._autocommit() as conn:
+                        if existing is not None:
+                            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.index_name}"))
+                        if wanted is not None:
+                            conn.execute(text(self._index_sql(wanted)))
+                except Exception:
+                    logger.exception("Index %s on %s could not be %s", self.index_name, self.table_name, action)
+                    self._drop_invalid_index()
+                    self.index_state = None
+                    return "failed"
+                existing = wanted
+
+            self.index_state = existing
+            return action
+
+    def _autocommit(self):
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+        return self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    def _drop_invalid_index(self):
+        """Drop the INVALID index a failed CONCURRENTLY build leaves behind, if any."""
+        try:
+            with self._autocommit() as conn:
+                if self._existing_index(conn) == ("invalid", None):
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.index_name}"))
+        except Exception:
+            logger.exception("Could not drop invalid index %s on %s", self.index_name, self.table_name)
+
+    def _index_sql(self, wanted: tuple) -> str:
+        if wanted[0] == "ivfflat":
+            options = f"lists = {wanted[1]}"
+        else:
+            options = f"m = {self.hnsw_m}, ef_construction = {self.hnsw_ef_construction}"
+        return (
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.index_name} "
+            f"ON {self.table_name} USING {wanted[0]} (embedding {EMBEDDING_OPS}) WITH ({options})"
+        )
+
+    def record_inserts(self, count: int = 1):
+        """
+        Count new rows; every index_check_interval inserts, re-check the index
+        in a background thread so the write path never waits on a build.
+        """
+        with self._counter_lock:
+            self._inserts_since_check += count
+            due = self._inserts_since_check >= self.index_check_interval
+            if due:
+                self._inserts_since_check = 0
+        if due:
+            threading.Thread(target=self._ensure_index_in_background, name=f"{self.table_name}-index", daemon=True).start()
+
+    def _ensure_index_in_background(self):
+        try:
+            self.ensure_index()
+        except Exception:
+            logger.exception("Index check on %s failed", self.table_name)
+
+    def search_settings(self, ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[str]:
+        """
+        SET LOCAL statements tuning the current index for one lookup transaction.
+        probes defaults to sqrt(lists), pgvector's recommended starting point.
+        """
+        if self.index_state is None:
+            return []
+        if self.index_state[0] == "hnsw":
+            return [f"SET LOCAL hnsw.ef_search = {int(ef_search or self.ef_search)}"]
+        if self.index_state[0] == "ivfflat":
+            probes = probes or self.probes or max(1, int(math.sqrt(self.index_state[1] or 1)))
+            return [f"SET LOCAL ivfflat.probes = {int(probes)}"]
+        return []
+
+    def index_info(self) -> Dict[str, object]:
+        """Current ANN index type and parameters"""
+        if self.index_state is None:
+            return {"index": None}
+        return {"index": self.index_state[0], "lists": self.index_state[1], "search": self.search_settings()}
+
     def get_table(self) -> Table:
         return self.table
 
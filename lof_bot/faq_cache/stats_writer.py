@@ -0,0 +1,154 @@
+# stats_writer.py
+
+import atexit
+import threading
+from datetime import datetime
+from typing import Any, Dict, Hashable, Tuple
+
+from sqlalchemy import Table, bindparam, update, values, column, Integer, DateTime
+
+
+class WriteBehindStats:
+    """
+    Write-behind aggregator for cache usage statistics.
+
+    record() only touches an in-memory dict, so reads never wait on the
+    database. Increments are coalesced per key and a background thread
+    writes them as one multi-row UPDATE ... FROM (VALUES ...) statement
+    every flush_interval seconds, or sooner once max_pending keys pile up.
+    Other databases (e.g. SQLite) get an executemany UPDATE instead.
+    close() (also run at interpreter exit) flushes whatever is left.
+    """
+
+    def __init__(
+        self,
+        engine,
+        table: Table,
+        key_column: str,
+        flush_interval: float = 5.0,
+        max_pending: int = 500,
+    ):
+        self.engine = engine
+        self.table = table
+        self.key_column = table.c[key_column]
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        # key -> (increment, latest access time)
+        self._pending: Dict[Hashable, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+        self.recorded = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.failures = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"{table.name}-stats-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, key: Hashable, count: int = 1):
+        """
+        Queue a usage increment for key. Never blocks on the database.
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            prev_count, _ = self._pending.get(key, (0, now))
+            self._pending[key] = (prev_count + count, now)
+            self.recorded += count
+            pending = len(self._pending)
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write all pending increments in one statement. Returns rows written.
+        On failure the increments are merged back for the next attempt.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            stmt, params = self._update_statement(batch)
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(stmt, params)
+            except Exception:
+                self.failures += 1
+                with self._lock:
+                    for key, (count, accessed_at) in batch.items():
+                        prev_count, prev_at = self._pending.get(key, (0, accessed_at))
+                        self._pending[key] = (prev_count + count, max(prev_at, accessed_at))
+                raise
+
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            return len(batch)
+
+    def _update_statement(self, batch: Dict[Hashable, Tuple[int, datetime]]):
+        if self.engine.dialect.name != "postgresql":
+            stmt = (
+                update(self.table)
+                .where(self.key_column == bindparam("pending_key"))
+                .values(
+                    frequency=self.table.c.frequency + bindparam("pending_increment"),
+                    last_accessed=bindparam("pending_accessed_at"),
+                )
+            )
+            return stmt, [
+                {"pending_key": key, "pending_increment": count, "pending_accessed_at": accessed_at}
+                for key, (count, accessed_at) in batch.items()
+            ]
+
+        rows = values(
+            column("key", self.key_column.type),
+            column("increment", Integer),
+            column("accessed_at", DateTime),
+            name="pending_stats",
+        ).data([(key, count, accessed_at) for key, (count, accessed_at) in batch.items()])
+
+        stmt = (
+            update(self.table)
+            .where(self.key_column == rows.c.key)
+            .values(
+                frequency=self.table.c.frequency + rows.c.increment,
+                last_accessed=rows.c.accessed_at,
+            )
+        )
+        return stmt, None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Stats flush for {self.table.name} failed: {e}")
+
+    def close(self):
+        """
+        Stop the background thread and flush remaining increments.
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending_keys": pending,
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "failures": self.failures,
+        }
@@ -0,0 +1,127 @@
+"""
+Load test for the HTTP API in api.py.
+
+Sends concurrent chat requests and reports throughput, status codes and
+p50/p95/p99 latency. With --spawn it starts uvicorn itself with the local
+stand-in model, so no database or API key is needed:
+
+    python load_test.py --spawn --requests 2000 --concurrency 64
+    python load_test.py --url http://localhost:8000 --stream
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+QUERIES = [
+    "What courses does Lab of Future offer?",
+    "Tell me about Space Robotics",
+    "How do I book a lab tour?",
+    "Is there a summer camp in Dubai?",
+    "How do I enroll in After School Clubs?",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def send(url: str, message: str, timeout: float) -> Tuple[int, float, float]:
+    """Send one request; return (status, time to first byte, total latency)"""
+    data = json.dumps({"message": message}).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read(1)
+            first_byte = time.perf_counter() - start
+            resp.read()
+            return resp.status, first_byte, time.perf_counter() - start
+    except urllib.error.HTTPError as e:
+        elapsed = time.perf_counter() - start
+        return e.code, elapsed, elapsed
+    except Exception:
+        elapsed = time.perf_counter() - start
+        return 0, elapsed, elapsed
+
+
+def wait_until_healthy(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"API at {base_url} did not become healthy")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Load test the Lab of Future API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream instead of /chat")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--spawn", action="store_true", help="Start uvicorn with the stand-in model")
+    parser.add_argument("--standin-latency", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        port = args.url.rsplit(":", 1)[-1]
+        env = dict(os.environ, LOF_API_STANDIN_LATENCY=str(args.standin_latency))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", port, "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+        )
+
+    try:
+        wait_until_healthy(args.url)
+        endpoint = f"{args.url}/chat/stream" if args.stream else f"{args.url}/chat"
+        messages = [QUERIES[i % len(QUERIES)] for i in range(args.requests)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda m: send(endpoint, m, args.timeout), messages))
+        wall_time = time.perf_counter() - start
+
+        ok_latencies = [total for status, _, total in results if status == 200]
+        ok_first_bytes = [first for status, first, _ in results if status == 200]
+        statuses = Counter(status for status, _, _ in results)
+
+        print(f"endpoint     {endpoint}")
+        print(f"requests     {args.requests} at concurrency {args.concurrency}")
+        print(f"wall time    {wall_time:.2f}s ({len(ok_latencies) / wall_time:.1f} ok req/s)")
+        print(f"statuses     {dict(statuses)}")
+        for pct in (50, 95, 99):
+            print(
+                f"p{pct:<11} total {percentile(ok_latencies, pct) * 1000:8.1f} ms"
+                f"   first byte {percentile(ok_first_bytes, pct) * 1000:8.1f} ms"
+            )
+
+        with urllib.request.urlopen(f"{args.url}/stats", timeout=5) as resp:
+            print(f"server stats {resp.read().decode('utf-8')}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
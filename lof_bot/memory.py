@@ -2,17 +2,35 @@
 
 from hashlib import sha256
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from sqlalchemy import (
-    create_engine, Table, Column, String, Integer, Text, DateTime, MetaData,
-    select, update, insert
+    Table, Column, String, Integer, Text, DateTime, MetaData, select
 )
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from faq_cache.engines import get_async_engine, get_engine
+from faq_cache.lru import TTLLRUCache
+from faq_cache.stats_writer import WriteBehindStats
 
 
 class FAQCacheMemory:
-    def __init__(self, db_url: str, table_name: str = "chatbot_memory"):
-        self.engine = create_engine(db_url)
+    """
+    Exact-match FAQ cache: an in-process LRU/TTL tier in front of Postgres.
+    Usage stats (frequency, last_accessed) go through a write-behind
+    aggregator and never block the read path.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        table_name: str = "chatbot_memory",
+        local_cache_size: int = 2048,
+        local_cache_ttl: float = 600.0,
+        stats_flush_interval: float = 5.0,
+    ):
+        # Shared with the FAQ cache and PgVector; see faq_cache/engines.py
+        self.engine = get_engine(db_url)
         self.metadata = MetaData()
 
         self.table = Table(
@@ -26,6 +44,26 @@ class FAQCacheMemory:
             Column("created_at", DateTime, default=datetime.utcnow, nullable=False),
         )
         self.metadata.create_all(self.engine)
+        self.db_url = db_url
+        self._async_engine = None
+
+        # Hot tier: query_hash -> response, served without touching Postgres
+        self.local_cache = TTLLRUCache(max_size=local_cache_size, ttl_seconds=local_cache_ttl)
+
+        # Usage stats are coalesced per query_hash and flushed in the background
+        self.stats_writer = WriteBehindStats(
+            self.engine, self.table, "query_hash", flush_interval=stats_flush_interval
+        )
+
+    @property
+    def async_engine(self):
+        """
+        Async engine for the asyncio pipeline, created on first use; psycopg 3
+        URLs work for both. Sync-only callers never need an async driver.
+        """
+        if self._async_engine is None:
+            self._async_engine = get_async_engine(self.db_url)
+        return self._async_engine
 
     def _hash_query(self, query: str) -> str:
         """
@@ -37,62 +75,104 @@ class FAQCacheMemory:
     def get_cached_response(self, query: str) -> Optional[str]:
         """
         Retrieve cached response for a given query if it exists.
-        Also updates frequency and last_accessed timestamp.
+        Hot entries come from the in-process tier; usage stats are batched.
         """
         query_hash = self._hash_query(query)
+        response = self.local_cache.get(query_hash)
+        if response is not None:
+            self._record_access(query_hash)
+            return response
+
         with self.engine.connect() as conn:
             stmt = select(self.table.c.response).where(self.table.c.query_hash == query_hash)
             result = conn.execute(stmt).first()
-            if result:
-                # Update usage stats asynchronously (best-effort)
-                try:
-                    self._update_stats(query_hash)
-                except Exception:
-                    pass
-                return result[0]
+        if result:
+            self.local_cache.put(query_hash, result[0])
+            self._record_access(query_hash)
+            return result[0]
         return None
 
-    def _update_stats(self, query_hash: str):
+    def _record_access(self, query_hash: str):
         """
-        Increment frequency and update last_accessed timestamp for a cached query.
+        Queue a frequency/last_accessed update with the write-behind aggregator.
         """
-        with self.engine.connect() as conn:
-            stmt = (
-                update(self.table)
-                .where(self.table.c.query_hash == query_hash)
-                .values(
-                    frequency=self.table.c.frequency + 1,
-                    last_accessed=datetime.utcnow()
-                )
-            )
-            conn.execute(stmt)
+        self.stats_writer.record(query_hash)
+
+    def flush_stats(self) -> int:
+        """
+        Write pending usage stats now. Returns the number of rows updated.
+        """
+        return self.stats_writer.flush()
+
+    def close(self):
+        """
+        Stop the background stats writer and flush pending increments.
+        """
+        self.stats_writer.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        In-process tier counters plus write-behind stats.
+        """
+        stats = self.local_cache.stats()
+        stats["stats_writer"] = self.stats_writer.stats()
+        return stats
+
+    def _upsert(self, query_hash: str, query: str, response: str):
+        """
+        INSERT ... ON CONFLICT DO UPDATE for one entry: a new row, or one more
+        use of an existing one. Returns the stored response.
+        """
+        now = datetime.utcnow()
+        # SQLite accepts the same ON CONFLICT clause
+        dialect_insert = sqlite_insert if self.engine.dialect.name == "sqlite" else pg_insert
+        stmt = dialect_insert(self.table).values(
+            query_hash=query_hash,
+            original_query=query,
+            response=response,
+            frequency=1,
+            last_accessed=now,
+            created_at=now,
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[self.table.c.query_hash],
+            set_={"frequency": self.table.c.frequency + 1, "last_accessed": now},
+        ).returning(self.table.c.response)
 
     def cache_response(self, query: str, response: str):
         """
         Cache a new query-response pair or update existing entry stats.
+        A single atomic upsert, so concurrent writers of one query cannot collide.
         """
         query_hash = self._hash_query(query)
-        now = datetime.utcnow()
-        with self.engine.connect() as conn:
-            # Check if already cached
-            stmt = select(self.table.c.query_hash).where(self.table.c.query_hash == query_hash)
-            exists = conn.execute(stmt).first()
-            if exists:
-                self._update_stats(query_hash)
-                # Optionally, update response text here if changed:
-                # update_stmt = (
-                #     update(self.table)
-                #     .where(self.table.c.query_hash == query_hash)
-                #     .values(response=response, last_accessed=now)
-                # )
-                # conn.execute(update_stmt)
-            else:
-                ins = insert(self.table).values(
-                    query_hash=query_hash,
-                    original_query=query,
-                    response=response,
-                    frequency=1,
-                    last_accessed=now,
-                    created_at=now,
-                )
-                conn.execute(ins)
+        with self.engine.begin() as conn:
+            stored = conn.execute(self._upsert(query_hash, query, response)).scalar()
+        self.local_cache.put(query_hash, stored)
+
+    async def aget_cached_response(self, query: str) -> Optional[str]:
+        """
+        Async version of get_cached_response using the async engine.
+        """
+        query_hash = self._hash_query(query)
+        response = self.local_cache.get(query_hash)
+        if response is not None:
+            self._record_access(query_hash)
+            return response
+
+        async with self.async_engine.connect() as conn:
+            stmt = select(self.table.c.response).where(self.table.c.query_hash == query_hash)
+            result = (await conn.execute(stmt)).first()
+        if not result:
+            return None
+        self.local_cache.put(query_hash, result[0])
+        self._record_access(query_hash)
+        return result[0]
+
+    async def acache_response(self, query: str, response: str):
+        """
+        Async version of cache_response using the async engine.
+        """
+        query_hash = self._hash_query(query)
+        async with self.async_engine.begin() as conn:
+            stored = (await conn.execute(self._upsert(query_hash, query, response))).scalar()
+        self.local_cache.put(query_hash, stored)
@@ -0,0 +1,213 @@
+"""
+Prometheus metrics for the query pipeline in main.py.
+
+Request-path updates are two metric families: stage latencies in one
+histogram labelled by stage, and query outcomes in one counter. Each
+update is a dict lookup plus prometheus_client's per-metric lock; label
+children are resolved once and reused. Connection pools, the FAQ cache's
+in-process tier and the embedding service are only read when Prometheus
+scrapes.
+
+prometheus_client is optional. Without it, or with LOF_METRICS=0, every
+function here is a no-op and render() returns None.
+
+Stages:
+  cache_lookup         FAQ cache lookup (local tier, then Postgres)
+  scope_check          classify_query + is_educational_query
+  knowledge_search     embedding + pgvector search (async path)
+  query_embedding      query embedding for a knowledge search (either path)
+  vector_search        pgvector search, net of query_embedding (either path)
+  agent_response       LLM generation (includes agno's own retrieval on the sync path)
+  post_process         process_response + enhance_response
+  cache_write          FAQ cache upsert
+  time_to_first_token  first streamed piece (streaming path)
+  total                whole query
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest, start_http_server
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    REGISTRY = None
+
+from faq_cache.engines import pool_stats
+
+ENABLED = REGISTRY is not None and os.getenv("LOF_METRICS", "1") != "0"
+
+# Seconds; spans cache hits (ms) through slow model calls (tens of s)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+OUTCOMES = ("cache_hit", "out_of_scope", "answered", "fallback")
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _StageTimer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Cancelled stages (e.g. speculative generation after a cache hit) are not latencies
+        if exc_type is None or issubclass(exc_type, Exception):
+            self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _StateCollector:
+    """
+    Gauges and counters read from live objects at scrape time.
+    """
+
+    def __init__(self):
+        self.faq_cache = None
+        self.embedding_service = None
+        self.admission = None
+
+    def collect(self):
+        checked_out = GaugeMetricFamily(
+            "lof_bot_db_pool_connections", "Connections per pool and state", labels=["pool", "state"]
+        )
+        capacity = GaugeMetricFamily("lof_bot_db_pool_capacity", "pool_size + max_overflow", labels=["pool"])
+        checkouts = CounterMetricFamily("lof_bot_db_pool_checkouts", "Pool checkouts", labels=["pool", "result"])
+        wait = GaugeMetricFamily("lof_bot_db_pool_max_checkout_wait_seconds", "Longest checkout wait", labels=["pool"])
+        for name, stats in pool_stats().items():
+            for state in ("checked_out", "idle", "overflow"):
+                checked_out.add_metric([name, state], stats[state])
+            capacity.add_metric([name], stats["capacity"])
+            checkouts.add_metric([name, "ok"], stats["checkouts"])
+            checkouts.add_metric([name, "slow"], stats["slow_checkouts"])
+            checkouts.add_metric([name, "timeout"], stats["checkout_timeouts"])
+            wait.add_metric([name], stats["max_checkout_wait"])
+        yield from (checked_out, capacity, checkouts, wait)
+
+        if self.faq_cache is not None:
+            stats = self.faq_cache.get_stats()
+            yield GaugeMetricFamily("lof_bot_faq_local_entries", "Entries in the in-process FAQ tier", value=stats["size"])
+            lookups = CounterMetricFamily("lof_bot_faq_local_lookups", "In-process FAQ tier lookups", labels=["result"])
+            lookups.add_metric(["hit"], stats["hits"])
+            lookups.add_metric(["miss"], stats["misses"])
+            yield lookups
+            yield CounterMetricFamily("lof_bot_faq_local_evictions", "LRU evictions", value=stats["evictions"])
+            yield GaugeMetricFamily(
+                "lof_bot_faq_stats_pending", "Usage updates waiting for the write-behind flush",
+                value=stats["stats_writer"]["pending_keys"],
+            )
+            yield CounterMetricFamily(
+                "lof_bot_faq_stats_flush_failures", "Failed write-behind flushes",
+                value=stats["stats_writer"]["failures"],
+            )
+
+        if self.embedding_service is not None:
+            stats = self.embedding_service.stats()
+            memory = stats["memory_cache"]
+            lookups = CounterMetricFamily("lof_bot_embedding_cache_lookups", "Embedding cache lookups", labels=["tier", "result"])
+            lookups.add_metric(["memory", "hit"], memory["hits"])
+            lookups.add_metric(["memory", "miss"], memory["misses"])
+            lookups.add_metric(["disk", "hit"], stats["disk_hits"])
+            yield lookups
+            yield CounterMetricFamily("lof_bot_embedding_backend_calls", "Embedding backend calls", value=stats["backend_calls"])
+            yield CounterMetricFamily("lof_bot_embedding_texts", "Texts sent to the embedding backend", value=stats["texts_embedded"])
+
+        if self.admission is not None:
+            stats = self.admission.stats()
+            yield GaugeMetricFamily("lof_bot_api_in_flight", "Requests holding a concurrency slot", value=stats["in_flight"])
+            yield GaugeMetricFamily("lof_bot_api_queue_depth", "Requests waiting for a slot", value=stats["queue_depth"])
+            requests = CounterMetricFamily("lof_bot_api_requests", "Admitted and shed requests", labels=["result"])
+            for result in ("completed", "failed", "rejected_queue_full", "rejected_timeout"):
+                requests.add_metric([result], stats[result])
+            yield requests
+
+
+_stage_children: Dict[str, Any] = {}
+_outcome_children: Dict[str, Any] = {}
+_collector = _StateCollector()
+_server_lock = threading.Lock()
+_server_ports = set()
+
+if ENABLED:
+    _stage_seconds = Histogram(
+        "lof_bot_stage_duration_seconds", "Latency of each query pipeline stage",
+        ["stage"], buckets=STAGE_BUCKETS,
+    )
+    _queries = Counter("lof_bot_queries", "Queries by outcome", ["outcome"])
+    for _outcome in OUTCOMES:
+        _outcome_children[_outcome] = _queries.labels(_outcome)
+    REGISTRY.register(_collector)
+
+
+def _stage_child(name: str):
+    child = _stage_children.get(name)
+    if child is None:
+        child = _stage_children[name] = _stage_seconds.labels(name)
+    return child
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage"""
+    if not ENABLED:
+        return _NOOP_TIMER
+    return _StageTimer(_stage_child(name))
+
+
+def observe(name: str, seconds: float):
+    """Record a stage duration measured elsewhere"""
+    if ENABLED:
+        _stage_child(name).observe(seconds)
+
+
+def count(outcome: str):
+    """Count a finished query: cache_hit, out_of_scope, answered or fallback"""
+    if ENABLED:
+        child = _outcome_children.get(outcome)
+        if child is None:
+            child = _outcome_children[outcome] = _queries.labels(outcome)
+        child.inc()
+
+
+def watch(faq_cache=None, embedding_service=None, admission=None):
+    """Export the state of these objects on every scrape"""
+    if admission is not None:
+        _collector.admission = admission
+    if faq_cache is not None:
+        _collector.faq_cache = faq_cache
+    if embedding_service is not None:
+        _collector.embedding_service = embedding_service
+
+
+def render() -> Optional[Tuple[bytes, str]]:
+    """Exposition text and its content type, or None when metrics are off"""
+    if not ENABLED:
+        return None
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def serve(port: int, addr: str = "0.0.0.0") -> bool:
+    """Start a standalone scrape endpoint (once per port); False when metrics are off"""
+    if not ENABLED:
+        return False
+    with _server_lock:
+        if port not in _server_ports:
+            start_http_server(port, addr)
+            _server_ports.add(port)
+    return True